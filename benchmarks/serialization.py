@@ -0,0 +1,141 @@
+#
+# Copyright (c) 2017 Siemens AG
+# Author: Alfonso Ros Dos Santos
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""Compare the pure Python and the libyaml YAML serialization
+
+Run from the repository root:
+
+  python benchmarks/serialization.py [--tests N] [--results N] [--repeat N]
+
+It times loading and dumping a job definition with many tests and a test
+results document like the ones returned by the LAVA master, with PyYAML's
+pure Python SafeLoader/SafeDumper and with the loader and dumper selected by
+lava_ctl.serialization.
+"""
+
+import sys
+import os
+import time
+import argparse
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from lava_ctl import serialization
+
+
+def job_definition(tests):
+    """A qemux86 job definition with the given number of inline tests"""
+    actions = [
+        {'deploy': {'timeout': {'minutes': 10}, 'to': 'tmpfs', 'os': 'oe',
+                    'images': {'kernel': {'url': 'https://host/bzImage'},
+                               'rootfs': {'url': 'https://host/rootfs.ext4'}},
+                    'root_partition': 1}},
+        {'boot': {'method': 'qemu', 'media': 'tmpfs',
+                  'timeout': {'minutes': 20}, 'prompts': ['root@qemux86:'],
+                  'auto_login': {'login_prompt': 'login:',
+                                 'username': 'root'}}},
+    ]
+    for i in range(tests):
+        name = 'test-%d' % i
+        actions.append({'test': {
+            'failure_retry': 3, 'name': name, 'timeout': {'minutes': 5},
+            'definitions': [{
+                'from': 'inline', 'name': name,
+                'path': 'inline/qemu-x86-test.yaml',
+                'repository': {
+                    'metadata': {'format': 'Lava-Test Test Definition 1.0',
+                                 'name': name, 'os': ['oe'],
+                                 'scope': ['functional'],
+                                 'description': 'server installation'},
+                    'run': {'steps': ['echo %d' % s for s in range(10)]}},
+            }]}})
+    return {'job_name': 'qemu-x86-test', 'priority': 'medium',
+            'visibility': 'public', 'device_type': 'qemu',
+            'context': {'arch': 'i386', 'no_kvm': True},
+            'timeouts': {'job': {'minutes': 60}, 'action': {'minutes': 10},
+                         'connection': {'minutes': 20}},
+            'actions': actions}
+
+
+def test_results(cases):
+    """A results document with the given number of test cases"""
+    return [{'job': '1234', 'suite': '%d_suite' % (i / 100), 'level': '1.1.1',
+             'name': 'case-%d' % i, 'result': 'pass' if i % 7 else 'fail',
+             'measurement': None, 'unit': '', 'duration': '%d.25' % (i % 60),
+             'url': '/results/1234/suite/case-%d' % i, 'logged': '2017-09-01',
+             'metadata': {'case': 'case-%d' % i, 'result': 'pass',
+                          'definition': 'suite', 'extra': 'extra-%d.yaml' % i}}
+            for i in range(cases)]
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def compare(name, data, repeat):
+    text = yaml.dump(data, Dumper=yaml.SafeDumper)
+
+    rows = [
+        ('load', lambda: yaml.load(text, Loader=yaml.SafeLoader),
+         lambda: serialization.load(text)),
+        ('dump', lambda: yaml.dump(data, Dumper=yaml.SafeDumper),
+         lambda: serialization.dump(data)),
+    ]
+
+    print "%s (%d KiB)" % (name, len(text) / 1024)
+    for operation, pure, fast in rows:
+        pure_time = best_time(pure, repeat)
+        fast_time = best_time(fast, repeat)
+        print "  %-5s pure %8.3fs  lava-ctl %8.3fs  x%.1f" % (
+            operation, pure_time, fast_time, pure_time / fast_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tests', type=int, default=500,
+                        help='tests in the job definition')
+    parser.add_argument('--results', type=int, default=20000,
+                        help='test cases in the results document')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='repetitions, the best time is reported')
+    args = parser.parse_args()
+
+    print "Loader: %s, Dumper: %s" % (serialization.Loader.__name__,
+                                      serialization.Dumper.__name__)
+    compare('job definition, %d tests' % args.tests,
+            job_definition(args.tests), args.repeat)
+    compare('test results, %d cases' % args.results,
+            test_results(args.results), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
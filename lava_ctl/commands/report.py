@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Siemens AG
+# Author: Alfonso Ros Dos Santos
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import sys
+import time
+import logging
+
+from terminaltables import AsciiTable
+
+from lava_ctl.lava.results import ResultsStore
+
+
+class Command(object):
+    """Report the test results recorded in the local results database"""
+
+    def __init__(self, logger=None):
+        super(Command, self).__init__()
+        self._logger = logger or logging.getLogger(__name__)
+
+    def add_arguments(self, subparsers):
+        """Define the arguments of the command"""
+        self.parser = subparsers.add_parser(
+            'report', help='Report past test results')
+        kind = self.parser.add_mutually_exclusive_group()
+        kind.add_argument(
+            '--failures', action='store_true',
+            help='failed test cases, most failed first (default)')
+        kind.add_argument(
+            '--flaky', action='store_true',
+            help='test cases whose result changes from run to run')
+        kind.add_argument(
+            '--durations', action='store_true',
+            help='duration of the tests over time')
+        self.parser.add_argument(
+            '--test', type=str, metavar='TEST',
+            help='only the durations of this test')
+        self.parser.add_argument(
+            '--name', type=str, metavar='PATTERN',
+            help='only the test sets matching the pattern, e.g. \'repo:*\'')
+        self.parser.add_argument(
+            '--days', type=float, metavar='DAYS',
+            help='only the jobs of the last days')
+        self.parser.add_argument(
+            '--limit', type=int, default=50, metavar='N',
+            help='maximum number of rows (default 50, 0 shows all)')
+        self.parser.set_defaults(evaluate=self.evaluate)
+
+    def evaluate(self, args, config):
+        """Evaluate if the necessary arguments are present"""
+        path = None
+        if config.has('lava.server.results.database'):
+            path = config.get('lava.server.results.database')
+        if path == '':
+            self._logger.error("The results database is disabled")
+            sys.exit(1)
+
+        store = ResultsStore(path=path, logger=self._logger)
+        name = args.name.replace('*', '%') if args.name else None
+        since = time.time() - args.days * 24 * 3600 if args.days else None
+        limit = args.limit or None
+
+        if args.flaky:
+            header = ['Test', 'Test Case', 'Runs', 'Failed', 'Changes',
+                      'Flakiness']
+            rows = [row[:5] + ('%.0f%%' % (row[5] * 100),) for row in
+                    store.flaky(name=name, since=since, limit=limit)]
+        elif args.durations:
+            header = ['Test', 'Job', 'Date', 'Device Type', 'Duration (s)']
+            rows = [(test, job, self._date(date), device,
+                     '%.1f' % (duration or 0))
+                    for test, job, date, device, duration in
+                    store.durations(test=args.test, name=name, since=since,
+                                    limit=limit)]
+        else:
+            header = ['Test', 'Test Case', 'Failed', 'Runs', 'Last Failed Job']
+            rows = store.failures(name=name, since=since, limit=limit)
+
+        if not rows:
+            self._logger.info("No results found in %s", store.path)
+            sys.exit(0)
+
+        print AsciiTable([header] + [[self._text(v) for v in row]
+                                     for row in rows]).table
+        sys.exit(0)
+
+    def _date(self, timestamp):
+        if timestamp is None:
+            return None
+        return time.strftime('%Y-%m-%d %H:%M', time.localtime(timestamp))
+
+    def _text(self, value):
+        return '' if value is None else unicode(value)
+
+    def __repr__(self):
+        return 'Command(report)'
+
+    def __str__(self):
+        return 'Command(report)'
+
+    def __unicode__(self):
+        return u'Command(report)'
@@ -23,15 +23,19 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
-import os
 import sys
-import yaml
-import shutil
+import time
+import logging
 
-from collections import defaultdict
+from itertools import izip, islice, groupby
+from collections import defaultdict, OrderedDict
+from multiprocessing.pool import ThreadPool
 
 from lava_ctl.lava.jobs import Job, JobDefinition
-from lava_ctl.lava.test import Test, TestSetsRepo
+from lava_ctl.lava.test import (TestSetsRepo, MirrorCache, TestSetCache,
+                                TestMatrix)
+from lava_ctl.lava.server import LavaServer, FailFast, SubmissionWindow
+from lava_ctl.lava.sharding import DurationHistory, balance
 from lava_ctl.config.schemas import TEST_SCHEMA
 from lava_ctl.config import Config
 
@@ -39,6 +43,12 @@ from lava_ctl.config import Config
 class Command(object):
     """Run the specified lava tests"""
 
+    # Test repositories fetched and parsed at the same time
+    PREPARE_THREADS = 8
+
+    # Job definitions validated and submitted together by --concurrent
+    SUBMIT_BATCH = 100
+
     def __init__(self, logger=None):
         super(Command, self).__init__()
         self._logger = logger or logging.getLogger(__name__)
@@ -53,6 +63,18 @@ class Command(object):
             'yaml_file', type=str, metavar='FILE', help='test description')
         self.parser.add_argument(
             '--no-wait', action='store_true', help='Don\'t wait for the job\'s result')
+        self.parser.add_argument(
+            '--concurrent', action='store_true',
+            help='submit all the test sets first and wait for them together')
+        self.parser.add_argument(
+            '--dry-run', action='store_true',
+            help='render and validate offline, don\'t submit anything')
+        self.parser.add_argument(
+            '--fail-fast', action='store_true',
+            help='cancel the remaining jobs as soon as a job or test fails')
+        self.parser.add_argument(
+            '--shards', type=int, default=1, metavar='N',
+            help='split every test set in up to N jobs of similar duration')
         self.parser.set_defaults(evaluate=self.evaluate)
 
     def evaluate(self, args, config):
@@ -70,36 +92,251 @@ class Command(object):
         test_config.validate()
         self._logger.debug('test order configuration: %s', test_config)
 
+        if args.shards < 1:
+            raise RuntimeError('--shards must be at least 1')
+        if args.fail_fast and args.no_wait:
+            raise RuntimeError('--fail-fast needs to wait for the jobs')
+
+        if args.dry_run:
+            test_results = self.dry_run(test_config, config, args)
+        elif args.concurrent:
+            test_results = self.run_concurrent(test_config, config, args)
+        else:
+            test_results = self.run_sequential(test_config, config, args)
+
+        # finish
+        sys.exit(0) if all(test_results) else sys.exit(1)
+
+    def job_definitions(self, test_config, config, lava_server=None,
+                        shards=1):
+        """Generate a (name, JobDefinition) pair for every test set
+
+        Every test set is run in each cell of the test matrix. The name of
+        the definition tells the cell when the matrix has more than one.
+
+        With more than one shard, the tests of a set are split in several
+        definitions with the same name, balanced by the durations of the
+        tests the last time the set was run in lava_server.
+        """
+        history = DurationHistory(lava_server, logger=self._logger)
+        matrix = TestMatrix.from_config(test_config, logger=self._logger)
+        cache = MirrorCache(config=config, logger=self._logger)
+        set_cache = TestSetCache(logger=self._logger)
+        repo_refs = test_config.get('test_repos')
+        repos = [TestSetsRepo(repo_ref, cache=cache, set_cache=set_cache,
+                              logger=self._logger) for repo_ref in repo_refs]
+        self.prepare_repos(repos)
+
+        for repo_ref, repo in izip(repo_refs, repos):
+            with repo as test_sets:
+                for filename, test_set in izip(repo_ref['tests'], test_sets):
+                    for cell in matrix.cells():
+                        name = '%s:%s' % (repo_ref['url'], filename)
+                        if not matrix.is_single():
+                            name += '[%s]' % cell.label
+
+                        for tests in self.shard(name, test_set, shards,
+                                                history):
+
+                            # TODO refactor job class
+                            conf = defaultdict(lambda: None)
+                            conf['device'] = cell.device
+                            conf.update(cell.image)
+
+                            job = Job(config=conf, logger=self._logger)
+                            for test in tests:
+                                if cell.params:
+                                    test = test.with_params(cell.params)
+                                job.add_test(test)
+
+                            jobdef = JobDefinition(
+                                job=job, config=config, logger=self._logger,
+                                lava_server=lava_server)
+                            yield name, jobdef
+
+    def shard(self, name, test_set, shards, history):
+        """Return the lists of tests to run as separate jobs
+
+        Multinode test sets are never split, their roles run together.
+        """
+        if shards < 2 or len(test_set) < 2:
+            return [test_set]
+        if any(test.roles for test in test_set):
+            self._logger.warning("Not splitting the multinode test set %s",
+                                 name)
+            return [test_set]
+
+        split = balance(test_set, shards, history.durations(name))
+        self._logger.info("Test set %s split in %d jobs", name, len(split))
+        return split
+
+    def prepare_repos(self, repos):
+        """Fetch the test repositories and parse their test sets in parallel
+
+        The parsed test sets are left in the TestSetCache, where the jobs
+        are generated from afterwards. The repositories whose test sets are
+        all cached are skipped.
+        """
+        repos = [repo for repo in repos if not repo.cached()]
+        if not repos:
+            return
+
+        pool = ThreadPool(min(len(repos), self.PREPARE_THREADS))
+        try:
+            pool.map(TestSetsRepo.prepare, repos)
+        finally:
+            pool.close()
+            pool.join()
+
+    def dry_run(self, test_config, config, args):
+        """Render and validate every test set without contacting LAVA"""
+        rendering = checking = 0.0
+        valid = invalid = 0
+
+        jobdefs = self.job_definitions(test_config, config,
+                                       shards=args.shards)
+        while True:
+            start = time.time()
+            try:
+                name, jobdef = next(jobdefs)
+            except StopIteration:
+                break
+            rendered = time.time()
+            if jobdef.check():
+                valid += 1
+            else:
+                self._logger.error("Invalid job definition for %s", name)
+                invalid += 1
+            rendering += rendered - start
+            checking += time.time() - rendered
+
+        self._logger.info("Rendered %d job definitions in %.3fs",
+                          valid + invalid, rendering)
+        self._logger.info("Validated %d job definitions in %.3fs: "
+                          "%d valid, %d invalid", valid + invalid,
+                          checking, valid, invalid)
+        return [invalid == 0]
+
+    def run_sequential(self, test_config, config, args):
+        """Submit and wait for each test set one after the other"""
         test_results = []
 
-        for repo_ref in test_config.get('test_repos'):
-            with TestSetsRepo(repo_ref) as test_sets:
-                for test_set in test_sets:
+        # a single server for all the test sets, so that the limits of the
+        # submission window apply to the whole run, and the shards of a test
+        # set are waited together
+        server = LavaServer(config=config, logger=self._logger)
 
-                    # TODO refactor job class
-                    conf = defaultdict(lambda: None)
-                    conf['device'] = test_config.get('device')
-                    conf.update(test_config.get('image'))
+        jobdefs = self.job_definitions(test_config, config,
+                                       lava_server=server, shards=args.shards)
+        for name, group in groupby(jobdefs, key=lambda pair: pair[0]):
+            group = [jobdef for _, jobdef in group]
 
-                    job = Job(config=conf, logger=self._logger)
-                    for test in test_set:
-                        job.add_test(test)
+            # Submit the job to the LAVA server
+            if len(group) == 1:
+                success = all([jobdef.submit(wait=not args.no_wait, name=name)
+                               for jobdef in group])
+            else:
+                success = self.submit_shards(server, name, group, args)
 
-                    jobdef = JobDefinition(
-                        job=job, config=config, logger=self._logger)
+            if success:
+                self._logger.debug("Job finished successfully")
+            else:
+                self._logger.error("Job finished with errors")
 
-                    # Submit the job to the LAVA server
-                    success = jobdef.submit(wait=not args.no_wait)
+            test_results.append(success)
 
-                    if success:
-                        self._logger.debug("Job finished successfully")
-                    else:
-                        self._logger.error("Job finished with errors")
+            if args.fail_fast and not success:
+                self._logger.error("Not running the remaining test sets")
+                break
 
-                    test_results.append(success)
+        server.close()
+        return test_results
 
-        # finish
-        sys.exit(0) if all(test_results) else sys.exit(1)
+    def submit_shards(self, server, name, jobdefs, args):
+        """Submit the shards of a test set and wait for all of them"""
+        if not JobDefinition.validate_all(jobdefs, server):
+            self._logger.error("Invalid job definition for %s", name)
+            raise RuntimeError("Trying to submit invalid job")
+
+        fail_fast = None
+        if args.fail_fast:
+            fail_fast = FailFast(server, logger=self._logger)
+
+        job_list = []
+        for jobdef in jobdefs:
+            jobs = jobdef.submit_job(name=name)
+            if fail_fast:
+                fail_fast.watch(jobs)
+            job_list.extend(jobs)
+
+        if args.no_wait:
+            return True
+        if fail_fast:
+            # follows the results to cancel the shards on a failed test
+            test_sets = OrderedDict([(name, job_list)])
+            return server.wait_test_sets(test_sets, fail_fast=fail_fast)[name]
+        return server.wait(job_list)
+
+    def run_concurrent(self, test_config, config, args):
+        """Submit every test set up front and wait for all of them together
+
+        The definitions are generated, validated and submitted in batches of
+        SUBMIT_BATCH, so that only one batch is kept in memory. No further
+        batch is submitted after an invalid definition.
+
+        With --fail-fast, nothing else is submitted once a job fails, and
+        the jobs submitted are canceled.
+        """
+        server = LavaServer(config=config, logger=self._logger)
+        fail_fast = None
+        if args.fail_fast:
+            fail_fast = FailFast(server, logger=self._logger)
+
+        jobdefs = self.job_definitions(test_config, config, lava_server=server,
+                                       shards=args.shards)
+        test_sets = OrderedDict()
+        valid = True
+
+        try:
+            while valid and not (fail_fast and fail_fast.failed):
+                batch = list(islice(jobdefs, self.SUBMIT_BATCH))
+                if not batch:
+                    break
+
+                # Validate the whole batch before submitting any of it
+                if not JobDefinition.validate_all([j for _, j in batch],
+                                                  server):
+                    for name, jobdef in batch:
+                        if not jobdef.valid():
+                            self._logger.error(
+                                "Invalid job definition for %s", name)
+                    valid = False
+                    break
+
+                # the shards of a test set are reported together
+                for name, jobdef in batch:
+                    if fail_fast and fail_fast.failed:
+                        break
+                    try:
+                        job_list = jobdef.submit_job(name=name)
+                    except SubmissionWindow.Closed:
+                        break
+                    if fail_fast:
+                        fail_fast.watch(job_list)
+                    test_sets.setdefault(name, []).extend(job_list)
+        finally:
+            # releases the test repository being read
+            jobdefs.close()
+
+        if not valid and not test_sets:
+            return [False]
+
+        if args.no_wait:
+            return [valid] + [True] * len(test_sets)
+
+        results = server.wait_test_sets(test_sets, fail_fast=fail_fast)
+        server.close()
+        return [valid] + results.values()
 
     def __repr__(self):
         return 'Command(run)'
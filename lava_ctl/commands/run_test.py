@@ -25,11 +25,12 @@
 
 import os
 import sys
-import yaml
-import shutil
+import time
+import logging
 
+from lava_ctl import serialization
 from lava_ctl.lava.jobs import Job, JobDefinition
-from lava_ctl.lava.test import Test
+from lava_ctl.lava.test import Test, MirrorCache
 
 
 class Command(object):
@@ -61,6 +62,9 @@ class Command(object):
             'yaml_file', type=str, metavar='FILE', help='test description')
         self.parser.add_argument(
             '--no-wait', action='store_true', help='Don\'t wait for job result')
+        self.parser.add_argument(
+            '--dry-run', action='store_true',
+            help='render and validate offline, don\'t submit anything')
         self.parser.set_defaults(evaluate=self.evaluate)
 
     def check_meta(self, meta):
@@ -73,7 +77,7 @@ class Command(object):
         if len(missing) > 0:
             raise RuntimeError('Missing job configuration', missing)
 
-        if 'rootfs' in meta and meta['rootfs'].endswith('.gz'):
+        if meta.get('rootfs') and meta['rootfs'].endswith('.gz'):
             meta['compressed'] = True
 
         if meta['device'] == 'iot2000':
@@ -82,36 +86,34 @@ class Command(object):
         else:
             meta['image'] = None
 
+        # Job reads the image URL as in the test descriptions
+        meta['url'] = meta['image']
+
         return meta
 
+    def load_test(self, filename):
+        """Load a test description file"""
+        # Check if the file exists
+        if not os.path.exists(filename):
+            raise RuntimeError('File does not exist', filename)
+
+        with open(filename) as testfile:
+            return serialization.load(testfile)
+
     def evaluate(self, args, config):
         """Evaluate if the necessary arguments are present"""
 
         if args.repo:
-            repopath = os.path.join(os.curdir, 'test_repo')
             branch = 'master' if not args.branch else args.branch
-
-            import git
-            repo = git.Repo.clone_from(args.repo, repopath, branch=branch)
-
-            if args.rev:
-                gitcmd = repo.git
-                gitcmd.checkout(args.rev)
-
-            args.yaml_file = os.path.join(repopath, args.yaml_file)
-
-        # Check if the file exists
-        if not os.path.exists(args.yaml_file):
-            raise RuntimeError('File does not exist', args.yaml_file)
-
-        with open(args.yaml_file) as testfile:
-            test = yaml.load(testfile.read())
-
-        if args.repo:
-            shutil.rmtree(repopath)
+            cache = MirrorCache(config=config, logger=self._logger)
+            with cache.commit(args.repo, args.rev or branch) as commit:
+                test = serialization.load(
+                    MirrorCache.read(commit, args.yaml_file))
+        else:
+            test = self.load_test(args.yaml_file)
 
         self._logger.debug("test file content:\n%s",
-                           yaml.dump(test, default_flow_style=False))
+                           serialization.dump(test, default_flow_style=False))
 
         # Arguments contain image data
         if not args.device:
@@ -128,10 +130,22 @@ class Command(object):
                 job.add_test(Test(config=conf, logger=self._logger))
 
         # Create a LAVA job definition from the available configuration
+        start = time.time()
         jobdef = JobDefinition(job=job, config=config, logger=self._logger)
 
+        if args.dry_run:
+            rendered = time.time()
+            valid = jobdef.check()
+            self._logger.info("Rendered the job definition in %.3fs",
+                              rendered - start)
+            self._logger.info("Validated the job definition in %.3fs: %s",
+                              time.time() - rendered,
+                              'valid' if valid else 'invalid')
+            sys.exit(0) if valid else sys.exit(1)
+
         # Submit the job to the LAVA server
         success = jobdef.submit(wait=not args.no_wait)
+        jobdef.lava_server.close()
 
         if success:
             self._logger.debug("Job finished successfully")
@@ -26,6 +26,7 @@ WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import sys
 import os
+import time
 import logging
 
 from lava_ctl.lava.jobs import JobDefinition
@@ -46,6 +47,9 @@ class Command(object):
             'yaml_file', type=str, metavar='FILE', help='LAVA job definition')
         self.parser.add_argument(
             '--no-wait', action='store_true', help='Don\'t wait for job result')
+        self.parser.add_argument(
+            '--dry-run', action='store_true',
+            help='render and validate offline, don\'t submit anything')
         self.parser.set_defaults(evaluate=self.evaluate)
 
     def evaluate(self, args, config):
@@ -56,6 +60,7 @@ class Command(object):
         if not os.path.exists(filename):
             raise RuntimeError('File does not exist', filename)
 
+        start = time.time()
         try:
             #Create a LAVA job definition
             job = JobDefinition(filename=filename,
@@ -68,8 +73,19 @@ class Command(object):
             self._logger.error("Could not instantiate a LAVA Job definition")
             sys.exit(1)
 
+        if args.dry_run:
+            loaded = time.time()
+            valid = job.check()
+            self._logger.info("Loaded the job definition in %.3fs",
+                              loaded - start)
+            self._logger.info("Validated the job definition in %.3fs: %s",
+                              time.time() - loaded,
+                              'valid' if valid else 'invalid')
+            sys.exit(0) if valid else sys.exit(1)
+
         #Submit the job to the LAVA server
         success = job.submit(wait=not args.no_wait)
+        job.lava_server.close()
 
         if success:
             self._logger.debug("Job finished successfully")
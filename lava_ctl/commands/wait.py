@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Siemens AG
+# Author: Alfonso Ros Dos Santos
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import sys
+import time
+import logging
+
+from collections import OrderedDict
+
+from lava_ctl.lava.server import JobListener, LavaServer
+
+
+class Command(object):
+    """Wait for the jobs submitted by a previous lava-ctl run"""
+
+    def __init__(self, logger=None):
+        super(Command, self).__init__()
+        self._logger = logger or logging.getLogger(__name__)
+
+    def add_arguments(self, subparsers):
+        """Define the arguments of the command"""
+        self.parser = subparsers.add_parser(
+            'wait', help='Wait for the jobs of a previous run')
+        self.parser.add_argument(
+            'job_ids', type=str, nargs='*', metavar='JOB_ID',
+            help='jobs to wait for (default: the jobs of the last run)')
+        self.parser.add_argument(
+            '--run', type=str, metavar='RUN_ID',
+            help='wait for the jobs of this run from the journal')
+        self.parser.add_argument(
+            '--list', action='store_true', help='list the runs in the journal')
+        self.parser.set_defaults(evaluate=self.evaluate)
+
+    def evaluate(self, args, config):
+        """Evaluate if the necessary arguments are present"""
+        server = LavaServer(config=config, logger=self._logger)
+        journal = server.journal
+
+        if journal is None and not args.job_ids:
+            self._logger.error("The job journal is disabled")
+            sys.exit(1)
+
+        runs = journal.runs() if journal else OrderedDict()
+
+        if args.list:
+            for run_id, submissions in runs.items():
+                print "%s: %s" % (run_id, ', '.join(
+                    str(id) for s in submissions for id in s['jobs']))
+            sys.exit(0)
+
+        if args.job_ids:
+            submissions = [{'name': id, 'jobs': [id]} for id in args.job_ids]
+        elif args.run:
+            if args.run not in runs:
+                self._logger.error("Run %s not found in %s", args.run,
+                                   journal.path)
+                sys.exit(1)
+            submissions = runs[args.run]
+        elif runs:
+            submissions = runs.values()[-1]
+        else:
+            self._logger.error("No jobs found in %s", journal.path)
+            sys.exit(1)
+
+        test_sets = OrderedDict()
+        for submission in submissions:
+            name = submission['name'] or ', '.join(
+                str(id) for id in submission['jobs'])
+            test_sets[name] = submission['jobs']
+
+        self.reconcile(server, journal, test_sets)
+        results = server.wait_test_sets(test_sets)
+        server.close()
+
+        sys.exit(0) if all(results.values()) else sys.exit(1)
+
+    def reconcile(self, server, journal, test_sets):
+        """Bring the status of the jobs up to date
+
+        The jobs are registered in the JobListener before asking the
+        scheduler, so no notification is missed in between. Jobs already
+        finished according to the journal are not queried again.
+        """
+        known = journal.last_status() if journal else {}
+        listener = server.listener()
+        deadline = time.time() + server.timeout
+
+        job_ids = [id for job_list in test_sets.values() for id in job_list]
+        for job_id in job_ids:
+            listener.register(job_id, deadline=deadline)
+
+        unknown = [id for id in job_ids
+                   if known.get(str(id)) not in JobListener.FINISHED_JOB_STATUS]
+        for job_id, status in server.statuses(unknown).items():
+            if status:
+                known[str(job_id)] = status['job_status']
+
+        for job_id in job_ids:
+            status = known.get(str(job_id))
+            self._logger.info("Job %s -- status: %s", job_id, status)
+            if status:
+                listener.notify(job_id, status)
+
+    def __repr__(self):
+        return 'Command(wait)'
+
+    def __str__(self):
+        return 'Command(wait)'
+
+    def __unicode__(self):
+        return u'Command(wait)'
@@ -24,19 +24,16 @@
 #
 
 import copy
-import yaml
 import logging
 from collections import defaultdict
 
 from cerberus import Validator
 from pkg_resources import resource_filename
 
+from lava_ctl import serialization
 from lava_ctl.config.schemas import LAVACTL_SCHEMA
 
 
-yaml.add_representer(defaultdict, yaml.representer.Representer.represent_dict)
-
-
 class Config(object):
     """Base class for a Configuration dictionary
 
@@ -79,8 +76,7 @@ class Config(object):
         key -- key string in dot-notation
         """
         try:
-            access = lambda c, k: c[int(k)] if isinstance(c, list) else c[k]
-            return reduce(access, key.split('.'), self._config)
+            return self.__lookup(key)
         except (IndexError, KeyError):
             self._logger.error('wrong config key %s', key)
             raise KeyError('wrong config key', key)
@@ -91,11 +87,15 @@ class Config(object):
         key -- key string in dot-notation
         """
         try:
-            self.get(key)
+            self.__lookup(key)
             return True
-        except KeyError:
+        except (IndexError, KeyError, TypeError, ValueError):
             return False
 
+    def __lookup(self, key):
+        access = lambda c, k: c[int(k)] if isinstance(c, list) else c[k]
+        return reduce(access, key.split('.'), self._config)
+
     def set(self, key, value):
         """Set the value for a key in the configuration
         arguments:
@@ -103,11 +103,14 @@ class Config(object):
         value -- the value associated to the key
         """
         try:
-            access = lambda c, k: c[int(k)] if isinstance(c, list) else c[k]
+            value = self.__convert_to_schema_type(key, value)
+            # missing sections are created, the key is known to the schema
+            access = lambda c, k: (c[int(k)] if isinstance(c, list)
+                                   else c.setdefault(k, {}))
             keys = key.split('.')
             parents, last = keys[:-1], keys[-1]
             conf = reduce(access, parents, self._config)
-            conf[last] = self.__convert_to_schema_type(key, value)
+            conf[last] = value
             self._logger.debug("%s set to %s", key, conf[last])
 
         except (IndexError, KeyError):
@@ -124,12 +127,12 @@ class Config(object):
         try:
             with open(path, 'r') as src:
                 self._config.clear()
-                self._config.update(yaml.load(src))
+                self._config.update(serialization.load(src))
         except IOError, exc:
             self._logger.error('Could not read from file %s', path)
             raise exc
 
-        except yaml.YAMLError, exc:
+        except serialization.YAMLError, exc:
             self._logger.error("YAML Error with file: %s", path)
             raise exc
 
@@ -143,7 +146,7 @@ class Config(object):
         self.validate()
         try:
             with open(path, 'w') as cf:
-                cf.write(yaml.dump(self._config))
+                serialization.dump(self._config, cf)
         except IOError, exc:
             self._logger.error('Could not write to file %s', self._filename)
             raise exc
@@ -161,6 +164,9 @@ class Config(object):
         schema = self._schema
         schema = schema[keys[0]]
         for k in keys[1:]:
+            if 'valueschema' in schema:
+                schema = schema['valueschema']
+                continue
             if not 'schema' in schema:
                 matches = [s for s in schema['oneof'] if k in s['schema']]
                 schema = matches[0]['schema']
@@ -189,7 +195,7 @@ class Config(object):
             return bool(value)
 
     def __repr__(self):
-        return yaml.dump(self._config)
+        return serialization.dump(self._config)
 
 
 class ConfigManager(Config):
@@ -1,2 +1,3 @@
 from lavactl import LAVACTL_SCHEMA
 from test import TEST_SCHEMA
+from job import JOB_SCHEMA
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Siemens AG
+# Author: Alfonso Ros Dos Santos
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# Schema of the LAVA job definitions, for finding errors without a round trip
+# to the LAVA master. Only the parts of a definition that lava-ctl knows are
+# described, everything else is accepted as it is and left to the master.
+# The schema must never be stricter than the master: a definition rejected
+# here is not submitted.
+
+# Any scheme, the supported ones depend on the master and its dispatchers
+DOWNLOAD_URL_REGEX = '^[a-zA-Z][a-zA-Z0-9+.-]*:\/\/[^\s]+$'
+
+# Values the master turns into strings, like test parameters or revisions
+scalar = ['string', 'number', 'boolean']
+
+timeout = {
+    'type': 'dict',
+    'minlength': 1,
+    'schema': {
+        'days': {'type': 'number', 'min': 0},
+        'hours': {'type': 'number', 'min': 0},
+        'minutes': {'type': 'number', 'min': 0},
+        'seconds': {'type': 'number', 'min': 0},
+    },
+}
+
+roles = {
+    'type': 'list',
+    'nullable': True,
+    'schema': {'type': 'string'},
+}
+
+image = {
+    'type': 'dict',
+    'schema': {
+        'url': {
+            'required': True,
+            'type': 'string',
+            'regex': DOWNLOAD_URL_REGEX,
+        },
+        'compression': {
+            'type': 'string',
+            'allowed': ['gz', 'bz2', 'xz', 'zip'],
+        },
+    },
+}
+
+deploy_action = {
+    'to': {'required': True, 'type': 'string'},
+    'timeout': timeout,
+    'role': roles,
+    'os': {'type': 'string'},
+    'image': image,
+    'images': {'type': 'dict', 'valueschema': image},
+}
+
+boot_action = {
+    'method': {'required': True, 'type': 'string'},
+    'timeout': timeout,
+    'role': roles,
+    'media': {'type': 'string'},
+    'prompts': {'type': 'list', 'schema': {'type': 'string'}},
+    'auto_login': {
+        'type': 'dict',
+        'schema': {
+            'login_prompt': {'required': True, 'type': 'string'},
+            'username': {'required': True, 'type': 'string'},
+        },
+    },
+}
+
+test_action = {
+    'timeout': timeout,
+    'role': roles,
+    'name': {'type': 'string'},
+    'failure_retry': {'type': 'integer', 'min': 1},
+    # A test action runs either test definitions, monitors or interactive
+    # commands, the master tells if none of them is there
+    'definitions': {
+        'type': 'list',
+        'minlength': 1,
+        'excludes': ['monitors', 'interactive'],
+        'schema': {
+            'type': 'dict',
+            'schema': {
+                'from': {'required': True, 'type': 'string'},
+                'name': {'required': True, 'type': 'string'},
+                'path': {'required': True, 'type': 'string'},
+                'repository': {'required': True, 'type': ['string', 'dict']},
+                'revision': {'type': scalar},
+                'parameters': {
+                    'type': 'dict',
+                    'valueschema': {'type': scalar, 'nullable': True},
+                },
+            },
+        },
+    },
+    'monitors': {
+        'type': 'list',
+        'minlength': 1,
+        'excludes': ['definitions', 'interactive'],
+        'schema': {'type': 'dict'},
+    },
+    'interactive': {
+        'type': 'list',
+        'minlength': 1,
+        'excludes': ['definitions', 'monitors'],
+        'schema': {'type': 'dict'},
+    },
+}
+
+JOB_SCHEMA = {
+    'job_name': {
+        'required': True,
+        'type': 'string',
+        'minlength': 1,
+        'maxlength': 200,
+    },
+    'device_type': {'type': 'string'},
+    'priority': {
+        'anyof': [
+            {'type': 'string', 'allowed': ['high', 'medium', 'low']},
+            {'type': 'integer', 'min': 0, 'max': 100},
+        ],
+    },
+    'visibility': {
+        'anyof': [
+            {'type': 'string', 'allowed': ['public', 'personal']},
+            {'type': 'dict'},
+        ],
+    },
+    'timeouts': {
+        'required': True,
+        'type': 'dict',
+        'schema': {
+            'job': dict(timeout, required=True),
+            'action': timeout,
+            'connection': timeout,
+        },
+    },
+    'protocols': {
+        'type': 'dict',
+        'schema': {
+            'lava-multinode': {
+                'type': 'dict',
+                'schema': {
+                    'roles': {
+                        'required': True,
+                        'type': 'dict',
+                        'minlength': 1,
+                        'valueschema': {
+                            'type': 'dict',
+                            'schema': {
+                                'device_type': {'required': True,
+                                                'type': 'string'},
+                                'count': {'type': 'integer', 'min': 1},
+                            },
+                        },
+                    },
+                    'timeout': timeout,
+                },
+            },
+        },
+    },
+    'actions': {
+        'required': True,
+        'type': 'list',
+        'minlength': 1,
+        'schema': {
+            'type': 'dict',
+            'minlength': 1,
+            'maxlength': 1,
+            'schema': {
+                'deploy': {'type': 'dict', 'schema': deploy_action},
+                'boot': {'type': 'dict', 'schema': boot_action},
+                'test': {'type': 'dict', 'schema': test_action},
+            },
+        },
+    },
+}
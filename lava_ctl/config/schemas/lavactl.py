@@ -35,6 +35,18 @@ LAVACTL_SCHEMA = {
             'image': {'type': 'string', 'nullable': True},
         }
     },
+    'git': {
+        'type': 'dict',
+        'schema': {
+            'cache': {
+                'type': 'dict',
+                'schema': {
+                    'path': {'type': 'string'},
+                    'max_size': {'type': 'integer'},
+                },
+            },
+        },
+    },
     'lava': {
         'type': 'dict',
         'schema': {
@@ -45,10 +57,43 @@ LAVACTL_SCHEMA = {
                     'port': {'type': 'integer'},
                     'user': {'type': 'string'},
                     'token': {'type': 'string'},
+                    'rpc': {
+                        'type': 'dict',
+                        'schema': {
+                            'connections': {'type': 'integer'},
+                            'gzip_threshold': {'type': 'integer'},
+                        },
+                    },
                     'jobs': {
                         'type': 'dict',
                         'schema': {
                             'timeout': {'type': 'number'},
+                            'journal': {'type': 'string'},
+                            'journal_runs': {'type': 'integer', 'min': 1},
+                            'waiter': {
+                                'type': 'string',
+                                'allowed': ['auto', 'publisher', 'polling'],
+                            },
+                            'max_poll_interval': {'type': 'integer', 'min': 2},
+                            'max_in_flight': {'type': 'integer', 'min': 1},
+                            'max_in_flight_per_device_type': {
+                                'type': 'dict',
+                                'valueschema': {'type': 'integer', 'min': 1},
+                            },
+                        },
+                    },
+                    'results': {
+                        'type': 'dict',
+                        'schema': {
+                            'database': {'type': 'string'},
+                            'stream_interval': {'type': 'integer'},
+                        },
+                    },
+                    'validation': {
+                        'type': 'dict',
+                        'schema': {
+                            'cache': {'type': 'boolean'},
+                            'ttl': {'type': 'integer'},
                         },
                     },
                 }
@@ -57,8 +102,22 @@ LAVACTL_SCHEMA = {
                 'type': 'dict',
                 'schema': {
                     'port': {'type': 'integer'},
+                    'topic': {'type': 'string'},
                 }
-            }
+            },
+            'placement': {
+                'type': 'dict',
+                'schema': {
+                    'groups': {
+                        'type': 'list',
+                        'schema': {
+                            'type': 'list',
+                            'schema': {'type': 'string'},
+                        },
+                    },
+                    'ttl': {'type': 'integer'},
+                },
+            },
         }
     },
 }
@@ -58,6 +58,12 @@ boot_from_wic_image = {
     },
 }
 
+matrix_cell = {
+    'device': {'type': 'string', 'validator': supported_device},
+    'image': {'type': ['string', 'integer']},
+    'params': {'type': 'dict'},
+}
+
 TEST_SCHEMA = {
     'device': {
         'required': False,
@@ -71,6 +77,38 @@ TEST_SCHEMA = {
             boot_from_wic_image,
         ],
     },
+    'matrix': {
+        'type': 'dict',
+        'schema': {
+            'devices': {
+                'type': 'list',
+                'schema': {'type': 'string', 'validator': supported_device},
+            },
+            'images': {
+                'type': 'list',
+                'schema': {
+                    'type': 'dict',
+                    'oneof_schema': [
+                        dict(boot_from_kernel_and_rootfs,
+                             name={'type': 'string'}),
+                        dict(boot_from_wic_image, name={'type': 'string'}),
+                    ],
+                },
+            },
+            'params': {
+                'type': 'dict',
+                'valueschema': {'type': 'list', 'minlength': 1},
+            },
+            'include': {
+                'type': 'list',
+                'schema': {'type': 'dict', 'schema': matrix_cell},
+            },
+            'exclude': {
+                'type': 'list',
+                'schema': {'type': 'dict', 'schema': matrix_cell},
+            },
+        },
+    },
     'test_repos': {
         'type': 'list',
         'schema': {
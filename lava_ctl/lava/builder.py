@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2017 Siemens AG
+Author: Alfonso Ros Dos Santos
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import copy
+import logging
+
+import yaml
+
+from lava_ctl.lava import devices
+
+
+class _TemplateRequired(Exception):
+    """A value of the job would not be copied verbatim by the templates"""
+    pass
+
+
+class JobBuilder(object):
+    """Build LAVA job definitions straight from Job and Test objects
+
+    The definitions are the same that the device templates produce, without
+    rendering YAML text and parsing it again. The templates write the values
+    of the job as they are into the YAML text, so that e.g. a step like
+    'echo a: b' becomes a mapping instead of a string. build() leaves such
+    jobs to the templates, so both ways always give the same definition.
+
+    """
+
+    KERNEL_IMAGE_ARG = '-kernel {kernel} -append "console=ttyS0 root=/dev/hda rw"'
+    ROOTFS_IMAGE_ARG = '-drive format=raw,file={rootfs}'
+
+    # First characters of YAML plain scalars that may have another meaning
+    INDICATORS = '-?:,[]{}#&*!|>\'"%@`'
+
+    def __init__(self, logger=None):
+        """JobBuilder initializer
+
+        keyword arguments:
+        logger -- the logger class (default None)
+        """
+        super(JobBuilder, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.JobBuilder')
+        self._resolver = yaml.resolver.Resolver()
+
+    def build(self, job):
+        """Return the job definition of a Job
+
+        Returns None if the device has no profile or if the job can only be
+        built with the device template.
+        """
+        profile = devices.DEVICE_PROFILES.get(job.device)
+        if profile is None:
+            return None
+
+        try:
+            return self._definition(job, profile)
+        except _TemplateRequired, e:
+            self._logger.debug('Using the device template: %s', e)
+            return None
+
+    def _definition(self, job, profile):
+        roles = [self._plain(role) for role in job.all_roles()]
+
+        definition = {
+            'job_name': profile['job_name'],
+            'priority': 'medium',
+            'visibility': 'public',
+            'timeouts': {
+                'job': {'minutes': 60},
+                'action': {'minutes': 10},
+                'connection': {'minutes': 20},
+            },
+            'actions': [
+                {'deploy': self._deploy(job, roles)},
+                {'boot': self._boot(profile, roles)},
+            ],
+        }
+
+        if roles:
+            definition['protocols'] = {
+                'lava-multinode': {
+                    'roles': dict((role, self._role(profile)) for role in roles),
+                    'timeout': {'minutes': 6},
+                }
+            }
+        else:
+            definition.update(copy.deepcopy(profile['device']))
+
+        for test in job.tests:
+            if test.inline:
+                action = self._inline_test(test, profile)
+            else:
+                action = self._test(test)
+            definition['actions'].append({'test': action})
+
+        return definition
+
+    def _role(self, profile):
+        role = copy.deepcopy(profile['device'])
+        role.update(copy.deepcopy(profile['role']))
+        return role
+
+    def _deploy(self, job, roles):
+        deploy = {'timeout': {'minutes': 10}, 'to': 'tmpfs', 'os': 'oe'}
+        if roles:
+            deploy['role'] = list(roles)
+
+        if job.image:
+            deploy['image'] = {
+                'url': self._plain(job.image),
+                'config_partition': 1,
+                'root_partition': 3,
+                'compression': 'gz',
+            }
+        elif job.kernel and job.rootfs:
+            rootfs = {
+                'image_arg': self.ROOTFS_IMAGE_ARG,
+                'url': self._plain(job.rootfs),
+            }
+            if job.compressed:
+                rootfs['compression'] = 'gz'
+            deploy['images'] = {
+                'kernel': {
+                    'image_arg': self.KERNEL_IMAGE_ARG,
+                    'url': self._plain(job.kernel),
+                },
+                'rootfs': rootfs,
+            }
+            deploy['root_partition'] = 1
+
+        return deploy
+
+    def _boot(self, profile, roles):
+        boot = copy.deepcopy(profile['boot'])
+        boot['media'] = 'tmpfs'
+        # The templates always write the key, even without roles
+        boot['role'] = list(roles) if roles else None
+        return boot
+
+    def _test_action(self, test, name):
+        action = {
+            'failure_retry': 3,
+            'name': name,
+            'timeout': {'minutes': 5},
+        }
+        if test.roles:
+            action['role'] = [self._plain(role) for role in self._list(test.roles)]
+        return action
+
+    def _inline_test(self, test, profile):
+        name = self._plain(test.name)
+        steps = [self._plain(step) for step in self._list(test.steps)]
+
+        action = self._test_action(test, name)
+        action['definitions'] = [{
+            'repository': {
+                'metadata': {
+                    'format': 'Lava-Test Test Definition 1.0',
+                    'name': name,
+                    'description': 'server installation',
+                    'os': ['oe'],
+                    'scope': ['functional'],
+                },
+                'run': {'steps': steps or None},
+            },
+            'from': 'inline',
+            'name': name,
+            'path': 'inline/%s.yaml' % profile['job_name'],
+        }]
+        return action
+
+    def _test(self, test):
+        name = self._plain(test.name)
+        definition = {
+            'repository': self._plain(test.repo),
+            'from': 'git',
+            'path': name + '.yaml',
+            'name': name,
+        }
+        if test.revision:
+            definition['revision'] = self._plain(test.revision)
+        if test.params:
+            if not isinstance(test.params, dict):
+                raise _TemplateRequired('parameters are not a mapping')
+            definition['parameters'] = dict(
+                (self._quoted(key), self._quoted(value))
+                for key, value in test.params.iteritems())
+
+        action = self._test_action(test, name)
+        action['definitions'] = [definition]
+        return action
+
+    def _list(self, value):
+        if not isinstance(value, list):
+            raise _TemplateRequired('%r is not a list' % (value,))
+        return value
+
+    def _plain(self, value):
+        """Return value if the templates would write it as a plain string"""
+        if isinstance(value, str):
+            try:
+                value.decode('ascii')
+            except UnicodeDecodeError:
+                raise _TemplateRequired('%r is not ASCII' % (value,))
+        elif not isinstance(value, unicode):
+            raise _TemplateRequired('%r is not a string' % (value,))
+
+        if (not value or value != value.strip()
+                or value[0] in self.INDICATORS or value.startswith('...')
+                or ': ' in value or ' #' in value or value.endswith(':')
+                or '\t' in value or '\n' in value or '\r' in value
+                or yaml.reader.Reader.NON_PRINTABLE.search(value)):
+            raise _TemplateRequired('%r is not a plain YAML string' % (value,))
+
+        tag = self._resolver.resolve(yaml.ScalarNode, value, (True, False))
+        if tag != yaml.resolver.Resolver.DEFAULT_SCALAR_TAG:
+            raise _TemplateRequired('%r is read as %s' % (value, tag))
+        return value
+
+    def _quoted(self, value):
+        """Return the string the templates write within double quotes"""
+        try:
+            value = unicode(value)
+        except UnicodeDecodeError:
+            raise _TemplateRequired('%r is not ASCII' % (value,))
+
+        if ('"' in value or '\\' in value or '\n' in value or '\r' in value
+                or yaml.reader.Reader.NON_PRINTABLE.search(value)):
+            raise _TemplateRequired('%r is not a quoted YAML string' % (value,))
+        return value
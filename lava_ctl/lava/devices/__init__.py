@@ -1 +1,115 @@
+import os
+import hashlib
+import tempfile
+import threading
+
+from jinja2 import Environment, PackageLoader, FileSystemBytecodeCache
+from jinja2.bccache import Bucket
+
+from lava_ctl.utils import lavactl_dir
+
 SUPPORTED_DEVICES = ['qemux86', 'iot2000']
+
+# What each device template sets, for building job definitions without
+# rendering the templates (see lava_ctl.lava.builder). The templates remain
+# the reference: a change in one of them must be reflected here.
+#
+#  job_name -- name of the jobs
+#  device -- device settings of a single node job
+#  role -- additional settings of every role in a multinode job
+#  boot -- settings of the boot action
+DEVICE_PROFILES = {
+    'qemux86': {
+        'job_name': 'qemu-x86-test',
+        'device': {
+            'device_type': 'qemu',
+            'context': {'arch': 'i386', 'no_kvm': True},
+        },
+        'role': {'count': 1},
+        'boot': {
+            'method': 'qemu',
+            'timeout': {'minutes': 20},
+            'prompts': ['root@qemux86:'],
+            'auto_login': {'login_prompt': 'login:', 'username': 'root'},
+        },
+    },
+    'iot2000': {
+        'job_name': 'iot2000-test',
+        'device': {'device_type': 'iot2000-usb'},
+        'role': {},
+        'boot': {
+            'method': 'minimal',
+            'timeout': {'minutes': 2},
+            'prompts': ['root@iot2000-ebs:'],
+            'auto_login': {'login_prompt': 'iot2000-ebs login:',
+                           'username': 'root'},
+            'parameters': {'shutdown-message': 'reboot: Restarting system'},
+        },
+    },
+}
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """Jinja bytecode cache keyed by the content of the templates
+
+    Different lava-ctl versions can share the cache directory without
+    invalidating each other's entries, and entries are written atomically so
+    that concurrent lava-ctl processes never read a partial file. A cache
+    that can't be written is simply not used.
+    """
+
+    def get_bucket(self, environment, name, filename, source):
+        checksum = self.get_source_checksum(source)
+        key = hashlib.sha1(name.encode('utf-8') + checksum).hexdigest()
+        bucket = Bucket(environment, key, checksum)
+        self.load_bytecode(bucket)
+        return bucket
+
+    def dump_bytecode(self, bucket):
+        try:
+            fd, path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as f:
+                bucket.write_bytecode(f)
+            os.rename(path, self._get_cache_filename(bucket))
+        except (IOError, OSError):
+            pass
+
+
+_environment = None
+_environment_lock = threading.Lock()
+
+
+def environment():
+    """Return the Jinja environment of the device templates
+
+    The environment is created once per process, with the templates of all
+    the SUPPORTED_DEVICES and their includes already compiled. The compiled
+    templates are also kept on disk in ~/.lava-ctl/cache/jinja for the next
+    processes.
+    """
+    global _environment
+    with _environment_lock:
+        if _environment is None:
+            try:
+                cache = TemplateBytecodeCache(lavactl_dir('cache', 'jinja', ''))
+            except OSError:
+                cache = None
+
+            env = Environment(
+                loader=PackageLoader('lava_ctl.lava.devices', 'templates'),
+                bytecode_cache=cache, auto_reload=False)
+
+            # the device templates and the templates they include
+            for name in env.list_templates(extensions=['yaml']):
+                env.get_template(name)
+
+            _environment = env
+    return _environment
+
+
+def get_template(device):
+    """Return the job template of a device
+
+    Raises jinja2.TemplateNotFound if there is no template for the device.
+    """
+    return environment().get_template(device + '.yaml')
@@ -31,13 +31,16 @@ import time
 import urllib2
 import logging
 import tempfile
-import yaml
 
 from progress.bar import Bar
-from jinja2 import Environment, PackageLoader, TemplateNotFound
+from jinja2 import TemplateNotFound
 
+from lava_ctl import serialization
 from lava_ctl.config import ConfigManager
+from lava_ctl.lava import devices
+from lava_ctl.lava.builder import JobBuilder
 from lava_ctl.lava.server import LavaServer
+from lava_ctl.lava.validation import JobValidator
 
 class Job(object):
     """Minimal configuration to run a LAVA job
@@ -118,65 +121,74 @@ class JobDefinition(object):
 
     """
 
-    def __init__(self, job=None, filename=None, config=None, logger=None):
+    def __init__(self, job=None, filename=None, config=None, logger=None,
+                 lava_server=None):
         """Parse and store the LAVA job definition.
 
         Args:
             filename (str): Path to the input file
+            lava_server (LavaServer): server connection to share between
+                several definitions (optional)
 
         """
         self._logger = logger or logging.getLogger(__name__ + '.JobDefinition')
         self._conf = config or ConfigManager()
+        self._lava_server = lava_server
+        self._text = None
 
         if filename:
             try:
                 with open(filename, 'rt') as f:
                     content = f.read()
-                    self._yaml = yaml.load(content)
+                    self._yaml = serialization.load(content)
             except IOError, e:
                 self._logger.error("Couldn't read the file %s", filename)
                 raise e
 
-            except yaml.YAMLError, e:
+            except serialization.YAMLError, e:
                 self._logger.error("Invalid YAML in file %s", filename)
                 raise e
 
         # Try to instantiate a LAVA definition using the configuration
         # parameters
         elif job:
-            env = Environment(loader=PackageLoader('lava_ctl.lava.devices', 'templates'))
+            self._yaml = JobBuilder(logger=self._logger).build(job)
+            if self._yaml is None:
+                self._yaml = self._render(job)
 
-            try:
-                device = env.get_template(job.device + '.yaml')
-            except TemplateNotFound:
-                self._logger.error('Device %s not supported', job.device)
-                raise RuntimeError('Device not supported', job.device)
+        self._logger.debug("Job Definition:\n=== BEGIN JOB DEFINITION ===\n%r\n"
+                           "=== END JOB DEFINITION ===", self)
 
-            self._logger.debug('Found template job for device %s', job.device)
+    def _render(self, job):
+        """Render the job definition of a Job with its device template"""
+        try:
+            device = devices.get_template(job.device)
+        except TemplateNotFound:
+            self._logger.error('Device %s not supported', job.device)
+            raise RuntimeError('Device not supported', job.device)
 
-            roles = job.all_roles()
+        self._logger.debug('Found template job for device %s', job.device)
 
-            # Template context
-            context = {}
-            context['kernel_url'] = job.kernel
-            context['rootfs_url'] = job.rootfs
-            context['image_url'] = job.image
-            context['compression'] = job.compressed
-            context['multinode'] = len(roles) > 0
-            context['roles'] = roles
+        roles = job.all_roles()
 
-            # Add the specified tests if any
-            if job.has_tests():
-                context['test'] = True
-                context['test_repos'] = []
+        # Template context
+        context = {}
+        context['kernel_url'] = job.kernel
+        context['rootfs_url'] = job.rootfs
+        context['image_url'] = job.image
+        context['compression'] = job.compressed
+        context['multinode'] = len(roles) > 0
+        context['roles'] = roles
 
-                for test in job.tests:
-                    context['test_repos'].append(test)
+        # Add the specified tests if any
+        if job.has_tests():
+            context['test'] = True
+            context['test_repos'] = []
 
-            self._yaml = yaml.load(device.render(context))
+            for test in job.tests:
+                context['test_repos'].append(test)
 
-        self._logger.debug("Job Definition:\n=== BEGIN JOB DEFINITION ===\n%r\n"
-                           "=== END JOB DEFINITION ===", self)
+        return serialization.load(device.render(context))
 
     def get(self, key):
         """Get the value associated to the input key in the job configuration"""
@@ -196,6 +208,8 @@ class JobDefinition(object):
         access = lambda c, k: c[int(k)] if isinstance(c, list) else c[k]
         cont = reduce(access, keys[:-1], self._yaml)
         cont[keys[-1]] = value
+        self._text = None
+        self._checked = self._valid = None
 
     @property
     def lava_server(self):
@@ -209,24 +223,93 @@ class JobDefinition(object):
                 config=self._conf, logger=self._logger)
         return self._lava_server
 
+    def check(self):
+        """Validate the job definition offline with the bundled LAVA schema"""
+        if getattr(self, '_checked', None) is None:
+            validator = JobValidator(logger=self._logger)
+            self._checked = validator.validate(self._yaml)
+            if not self._checked:
+                self._logger.error("Job definition error - %s",
+                                   validator.errors)
+        return self._checked
+
     def valid(self):
-        """Validate the job definition using the LAVA server"""
+        """Validate the job definition using the LAVA server
+
+        The definitions with errors found by check() are not sent to the
+        server.
+        """
         if getattr(self, '_valid', None) is None:
-            self._valid = self.lava_server.validate(self.__str__())
+            self._valid = (self.check() and
+                           self.lava_server.validate(self.__str__()))
         return self._valid
 
-    def submit(self, wait=True):
-        """Submit the job to the LAVA server"""
+    @staticmethod
+    def validate_all(job_definitions, lava_server):
+        """Validate several job definitions with a few round trips
+
+        The validity of each definition is remembered by valid().
+        """
+        pending = [d for d in job_definitions
+                   if getattr(d, '_valid', None) is None]
+        for definition in pending:
+            if not definition.check():
+                definition._valid = False
+        pending = [d for d in pending if getattr(d, '_valid', None) is None]
+        for definition, valid in zip(pending, lava_server.validate_all(pending)):
+            definition._valid = valid
+        return all(d.valid() for d in job_definitions)
+
+    def submit(self, wait=True, name=None):
+        """Submit the job to the LAVA server
+
+        keyword arguments:
+        wait -- wait for the job to finish (default True)
+        name -- name to record the job with in the journal (default None)
+        """
         if self.valid():
-            result = self.lava_server.submit(self.__str__(), wait)
+            try:
+                result = self.lava_server.submit(self.__str__(), wait,
+                                                 name=name,
+                                                 definition=self._yaml)
+            finally:
+                self._placed()
         else:
             self._logger.error("Trying to submit invalid job")
             raise RuntimeError("Trying to submit invalid job")
 
         return result if result else False
 
+    def submit_job(self, name=None):
+        """Submit the job to the LAVA server and return the job IDs
+
+        Unlike submit(), this method never waits for the job to finish. Use
+        LavaServer.wait() with the returned IDs to collect the results.
+        """
+        if not self.valid():
+            self._logger.error("Trying to submit invalid job")
+            raise RuntimeError("Trying to submit invalid job")
+
+        try:
+            return self.lava_server.submit_job(self.__str__(), name=name,
+                                               definition=self._yaml)
+        finally:
+            self._placed()
+
+    def _placed(self):
+        """Forget what depended on the device types after a submission
+
+        The LavaServer may have moved the job to other device types, see
+        LavaServer.submit_job().
+        """
+        self._text = None
+        self._checked = self._valid = None
+
     def __str__(self):
-        return yaml.dump(self._yaml)
+        # Serialized once, until the definition changes with set()
+        if self._text is None:
+            self._text = serialization.dump(self._yaml)
+        return self._text
 
     def __repr__(self):
-        return yaml.dump(self._yaml)
+        return self.__str__()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2017 Siemens AG
+Author: Alfonso Ros Dos Santos
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+from lava_ctl.utils import lavactl_dir
+
+
+class JobJournal(object):
+    """Append-only record of the submitted jobs and their notifications
+
+    Every lava-ctl process appends one JSON object per line to the journal:
+
+      {"type": "submit", "run": RUN, "jobs": [ID, ...], "name": NAME, ...}
+      {"type": "status", "run": RUN, "job": ID, "status": STATUS, ...}
+
+    where RUN identifies the process that wrote the entry. If the process
+    dies, the journal is enough to find its jobs again and wait for them
+    instead of submitting them again (see the 'wait' command).
+
+    The runs and the statuses are indexed in memory, and only the lines
+    appended since the last query are read. Once the journal has more than
+    twice max_runs runs, it is compacted down to the last max_runs runs and
+    the last status of their jobs. The processes hold a shared lock on the
+    file path + '.lock' to append, and an exclusive one to compact.
+
+    """
+
+    # Runs kept when the journal is compacted
+    MAX_RUNS = 100
+
+    def __init__(self, path=None, max_runs=None, logger=None):
+        """JobJournal initializer
+
+        keyword arguments:
+        path -- journal file (default ~/.lava-ctl/journal)
+        max_runs -- runs kept when compacting the journal (default MAX_RUNS)
+        logger -- the logger class (default None)
+        """
+        super(JobJournal, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.JobJournal')
+        self._path = path or lavactl_dir('journal')
+        self._max_runs = max_runs or self.MAX_RUNS
+        self._run_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+
+        # index of the journal up to self._offset of the file self._inode
+        self._inode = None
+        self._offset = 0
+        self._runs = OrderedDict()
+        self._status = {}
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def run_id(self):
+        """Identifier of the entries written by this process"""
+        return self._run_id
+
+    def record_submit(self, job_list, name=None):
+        """Record the IDs of the jobs created by a submission"""
+        self._append({'type': 'submit', 'jobs': job_list, 'name': name})
+
+    def record_status(self, job_id, status):
+        """Record a job notification"""
+        self._append({'type': 'status', 'job': job_id, 'status': status})
+
+    def entries(self):
+        """Generate all the entries in the journal, oldest first"""
+        if not os.path.exists(self._path):
+            return
+
+        with open(self._path, 'r') as journal:
+            for line in journal:
+                entry = self._parse(line)
+                if entry is not None:
+                    yield entry
+
+    def runs(self):
+        """Return the submissions of every run, oldest run first
+
+        The result maps each run ID to the list of its 'submit' entries.
+        """
+        with self._lock:
+            self._update()
+            return OrderedDict((run, list(entries))
+                               for run, entries in self._runs.items())
+
+    def last_status(self):
+        """Return the last recorded status of every job by job ID string"""
+        with self._lock:
+            self._update()
+            return dict((job, entry['status'])
+                        for job, entry in self._status.items())
+
+    def _update(self):
+        """Index the new entries, compacting the journal if it's too long"""
+        self._read()
+        if len(self._runs) > 2 * self._max_runs:
+            self._compact()
+
+    def _read(self):
+        """Index the entries appended since the last read"""
+        try:
+            journal = open(self._path, 'r')
+        except IOError:
+            self._reset(None)
+            return
+
+        with journal:
+            stat = os.fstat(journal.fileno())
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                # replaced by another process compacting it
+                self._reset(stat.st_ino)
+
+            journal.seek(self._offset)
+            while True:
+                line = journal.readline()
+                if not line.endswith('\n'):
+                    # The last line may be incomplete if it is being written
+                    # or if a process died while writing it
+                    break
+                self._offset += len(line)
+                self._index(self._parse(line))
+
+    def _reset(self, inode):
+        self._inode = inode
+        self._offset = 0
+        self._runs.clear()
+        self._status.clear()
+
+    def _parse(self, line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            self._logger.debug("Ignoring journal line: %r", line)
+            return None
+
+    def _index(self, entry):
+        if not isinstance(entry, dict):
+            return
+        if entry.get('type') == 'submit' and 'jobs' in entry:
+            self._runs.setdefault(entry.get('run'), []).append(entry)
+        elif entry.get('type') == 'status' and 'job' in entry:
+            self._status[str(entry['job'])] = entry
+
+    def _compact(self):
+        """Keep only the last max_runs runs and the status of their jobs"""
+        try:
+            with self._file_lock(fcntl.LOCK_EX):
+                # other processes may have appended or compacted meanwhile
+                self._read()
+                if len(self._runs) <= 2 * self._max_runs:
+                    return
+
+                runs = self._runs.items()[-self._max_runs:]
+                jobs = set(str(id) for _, entries in runs
+                           for entry in entries for id in entry['jobs'])
+                status = dict((job, entry) for job, entry
+                              in self._status.items() if job in jobs)
+
+                compacted = self._path + '.compact'
+                with open(compacted, 'w') as journal:
+                    for _, entries in runs:
+                        for entry in entries:
+                            journal.write(json.dumps(entry) + '\n')
+                    for entry in status.values():
+                        journal.write(json.dumps(entry) + '\n')
+                    journal.flush()
+                    stat = os.fstat(journal.fileno())
+                os.rename(compacted, self._path)
+
+                self._reset(stat.st_ino)
+                self._offset = stat.st_size
+                self._runs.update(runs)
+                self._status.update(status)
+        except (IOError, OSError), exc:
+            self._logger.warning("Could not compact the journal %s - %s",
+                                 self._path, exc)
+
+    @contextmanager
+    def _file_lock(self, operation):
+        """Lock the journal against other processes"""
+        with open(self._path + '.lock', 'a') as lock:
+            fcntl.flock(lock, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _append(self, entry):
+        entry['run'] = self._run_id
+        entry['time'] = time.time()
+        line = json.dumps(entry) + '\n'
+
+        # A single write of a whole line in append mode, so that concurrent
+        # processes don't interleave their entries. The file is opened with
+        # the lock held, so that it's never written while being compacted.
+        with self._lock:
+            try:
+                with self._file_lock(fcntl.LOCK_SH):
+                    with open(self._path, 'a') as journal:
+                        journal.write(line)
+            except IOError, exc:
+                self._logger.warning("Could not write to the journal %s - %s",
+                                     self._path, exc)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2017 Siemens AG
+Author: Alfonso Ros Dos Santos
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+
+import logging
+import threading
+import time
+
+
+class DevicePlacement(object):
+    """Choose the device type of the jobs according to the devices available
+
+    Some device types are equivalent for the tests, for example several
+    variants of qemu, or pools of the same board registered under different
+    names. When a job asks for one of them, it is moved to the device type
+    of its group with the most idle devices and the shortest queue.
+
+    The availability is read from the LAVA master at most once every ttl
+    seconds. In between, the jobs placed by this process are counted as
+    queued, so that a burst of submissions is spread over the group instead
+    of being sent to the type that was idle at the last refresh.
+
+    """
+
+    # Seconds the availability of the devices is trusted
+    DEFAULT_TTL = 30
+
+    def __init__(self, lava_server, groups, ttl=None, logger=None):
+        """DevicePlacement initializer
+
+        keyword arguments:
+        lava_server -- LavaServer to read the availability from
+        groups -- list with the lists of equivalent device types
+        ttl -- seconds the availability is cached (default DEFAULT_TTL)
+        logger -- the logger class (default None)
+        """
+        super(DevicePlacement, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.DevicePlacement')
+        self._lava_server = lava_server
+        self._ttl = self.DEFAULT_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._availability = None
+        self._updated = None
+        self._placed = {}
+
+        self._groups = {}
+        for group in groups:
+            for device_type in group:
+                self._groups[device_type] = list(group)
+
+    def place(self, definition):
+        """Move the job definition to the best device types of their groups
+
+        The definition (a dictionary) is modified in place, every role of a
+        multinode job is placed independently. Returns True if any device
+        type was changed.
+        """
+        requests = []
+        roles = definition.get('protocols', {}).get('lava-multinode', {})
+        for role in (roles.get('roles') or {}).values():
+            if isinstance(role, dict) and 'device_type' in role:
+                requests.append((role, role.get('count', 1)))
+        if 'device_type' in definition:
+            requests.append((definition, 1))
+
+        requests = [(target, count) for target, count in requests
+                    if target['device_type'] in self._groups]
+        if not requests:
+            return False
+
+        changed = False
+        with self._lock:
+            availability = self._refresh()
+            for target, count in requests:
+                current = target['device_type']
+                best = self._best(current, availability)
+                self._placed[best] = self._placed.get(best, 0) + count
+                if best != current:
+                    self._logger.info("Job moved from device type %s to %s",
+                                      current, best)
+                    target['device_type'] = best
+                    changed = True
+        return changed
+
+    def _best(self, device_type, availability):
+        """Return the device type of the group with the most free devices
+
+        The current device type wins the ties, and device types without
+        online devices are never chosen.
+        """
+        if availability is None:
+            return device_type
+
+        def score(name):
+            idle, pending, online = availability.get(name, (0, 0, 0))
+            return idle - pending - self._placed.get(name, 0)
+
+        best = device_type
+        for name in self._groups[device_type]:
+            if availability.get(name, (0, 0, 0))[2] and \
+                    score(name) > score(best):
+                best = name
+        return best
+
+    def _refresh(self):
+        """Return the cached availability, reading it again once expired"""
+        now = time.time()
+        if self._updated is None or now - self._updated >= self._ttl:
+            availability = self._lava_server.device_availability()
+            self._updated = now
+            if availability is not None:
+                self._availability = availability
+                self._placed = {}
+        return self._availability
+
+    def __repr__(self):
+        return 'DevicePlacement(%r)' % (sorted(self._groups),)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2017 Siemens AG
+Author: Alfonso Ros Dos Santos
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+
+import logging
+import threading
+import time
+
+
+class JobPoller(object):
+    """Feeds a JobListener with the job status polled from the scheduler
+
+    Where the LAVA publisher can't be reached, the JobListener never hears
+    about the jobs. The poller asks scheduler.job_status for all the jobs
+    being waited for in a few system.multicall round trips, and passes the
+    status to JobListener.notify(), so the rest of lava-ctl waits for the
+    jobs as usual.
+
+    The polls are spaced adaptively:
+
+      - a poll that finds any job in a new state brings the interval back
+        to the minimum, otherwise it grows by BACKOFF up to the maximum.
+      - while all the jobs are queued the interval is never under
+        QUEUED_INTERVAL.
+      - while all the jobs are running, there's no poll before the first
+        of them is expected to finish, according to how long the jobs that
+        finished before took.
+
+    A single poller per listener is shared by the whole process (see
+    JobPoller.instance).
+
+    """
+
+    MIN_INTERVAL = 2.0
+    MAX_INTERVAL = 60.0
+    QUEUED_INTERVAL = 10.0
+    BACKOFF = 1.5
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, lava_server, listener, max_interval=None, logger=None):
+        """Return the process-wide poller of the listener"""
+        with cls._instances_lock:
+            key = id(listener)
+            if key not in cls._instances:
+                cls._instances[key] = cls(lava_server, listener,
+                                          max_interval=max_interval,
+                                          logger=logger)
+            return cls._instances[key]
+
+    @classmethod
+    def close_all(cls):
+        """Stop every poller of the process"""
+        with cls._instances_lock:
+            pollers = cls._instances.values()
+        for poller in pollers:
+            poller.close()
+
+    def __init__(self, lava_server, listener, max_interval=None, logger=None):
+        """JobPoller initializer
+
+        keyword arguments:
+        lava_server -- LavaServer to ask for the status of the jobs
+        listener -- JobListener to notify
+        max_interval -- maximum seconds between polls (default MAX_INTERVAL)
+        logger -- the logger class (default None)
+        """
+        super(JobPoller, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.JobPoller')
+        self._lava_server = lava_server
+        self._listener = listener
+        self._max_interval = max(self.MIN_INTERVAL,
+                                 max_interval or self.MAX_INTERVAL)
+        self._interval = self.MIN_INTERVAL
+        self._status = {}
+        self._started = {}
+        self._durations = []
+        self._stop = threading.Event()
+
+        self._thread = threading.Thread(target=self._run, name='JobPoller')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        """Stop polling"""
+        self._stop.set()
+        self._thread.join()
+
+        with self._instances_lock:
+            if self._instances.get(id(self._listener)) is self:
+                del self._instances[id(self._listener)]
+
+    def _run(self):
+        while not self._stop.wait(self._next_poll()):
+            job_list = self._listener.pending()
+            self._forget(job_list)
+            if not job_list:
+                self._interval = self.MIN_INTERVAL
+                continue
+
+            try:
+                self.poll(job_list)
+            except Exception:
+                self._logger.exception("Error while polling the job status")
+                self._interval = self._max_interval
+
+    def poll(self, job_list):
+        """Ask for the status of the jobs and notify the changes"""
+        now = time.time()
+        changed = False
+        for job_id, status in self._lava_server.statuses(job_list).items():
+            status = status and status.get('job_status')
+            if not status:
+                continue
+
+            key = str(job_id)
+            if self._status.get(key) != status:
+                self._status[key] = status
+                changed = True
+                if status == 'Running':
+                    self._started[key] = now
+                elif key in self._started and \
+                        status in self._listener.FINISHED_JOB_STATUS:
+                    self._durations.append(now - self._started.pop(key))
+            self._listener.notify(job_id, status)
+
+        if changed:
+            self._interval = self.MIN_INTERVAL
+        else:
+            self._interval = min(self._max_interval,
+                                 self._interval * self.BACKOFF)
+
+        statuses = [self._status.get(str(id)) for id in job_list]
+        if all(s in (None, 'Submitted') for s in statuses):
+            self._interval = max(self._interval, min(self.QUEUED_INTERVAL,
+                                                     self._max_interval))
+
+        self._logger.debug("Polled %d jobs, next poll in %.1fs",
+                           len(job_list), self._next_poll())
+
+    def _forget(self, job_list):
+        """Stop following the jobs that finished without being polled"""
+        now = time.time()
+        pending = set(str(id) for id in job_list)
+        for key in [k for k in self._started if k not in pending]:
+            self._durations.append(now - self._started.pop(key))
+        for key in [k for k in self._status if k not in pending]:
+            del self._status[key]
+
+    def _next_poll(self):
+        """Seconds until the next poll"""
+        interval = self._interval
+        running = [self._started[str(id)] for id in self._listener.pending()
+                   if str(id) in self._started]
+        if self._durations and running and \
+                len(running) == len(self._listener.pending()):
+            typical = sorted(self._durations)[len(self._durations) // 2]
+            expected = min(running) + typical - time.time()
+            interval = max(interval, min(expected, self._max_interval))
+        return interval
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2017 Siemens AG
+Author: Alfonso Ros Dos Santos
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+
+import re
+import time
+import logging
+import sqlite3
+from contextlib import closing
+from collections import defaultdict
+from itertools import groupby
+
+from lava_ctl.utils import lavactl_dir
+
+# Index that LAVA prepends to the name of a test definition to name its
+# test suite
+SUITE_INDEX_REGEX = re.compile(r'^\d+_')
+
+
+def test_name(suite):
+    """Return the name of the test definition of a LAVA test suite"""
+    return SUITE_INDEX_REGEX.sub('', suite, count=1)
+
+
+class ResultsStore(object):
+    """Local SQLite database with the results of the jobs
+
+    The jobs are recorded when they are submitted, with their test set,
+    device types, images and the repository and revision of their tests.
+    Their test cases are recorded as they are reported, so that past
+    results can be queried without asking the LAVA master again (see the
+    'report' command).
+
+    The job IDs are only unique within a LAVA master, so the jobs are
+    recorded together with the URL of their master.
+
+    Every operation opens its own connection, so the store can be used
+    from several threads and processes at the same time.
+
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            server TEXT NOT NULL,
+            id TEXT NOT NULL,
+            name TEXT,
+            device_type TEXT,
+            kernel TEXT,
+            rootfs TEXT,
+            image TEXT,
+            submitted REAL,
+            recorded REAL,
+            PRIMARY KEY (server, id)
+        );
+        CREATE TABLE IF NOT EXISTS tests (
+            server TEXT NOT NULL,
+            job_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            repository TEXT,
+            revision TEXT,
+            PRIMARY KEY (server, job_id, name)
+        );
+        CREATE TABLE IF NOT EXISTS results (
+            server TEXT NOT NULL,
+            job_id TEXT NOT NULL,
+            suite TEXT NOT NULL,
+            test TEXT NOT NULL,
+            name TEXT NOT NULL,
+            result TEXT,
+            duration REAL,
+            measurement REAL,
+            unit TEXT,
+            logged TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_name ON jobs (name, submitted);
+        CREATE INDEX IF NOT EXISTS results_job ON results (server, job_id);
+        CREATE INDEX IF NOT EXISTS results_test ON results (test, name);
+        CREATE INDEX IF NOT EXISTS results_result ON results (result, test);
+    """
+
+    # Seconds to wait for another process writing to the database
+    LOCK_TIMEOUT = 30
+
+    # Time of a job, for the jobs not submitted by lava-ctl
+    JOB_TIME = 'COALESCE(jobs.submitted, jobs.recorded)'
+
+    def __init__(self, server=None, path=None, logger=None):
+        """ResultsStore initializer
+
+        keyword arguments:
+        server -- URL of the LAVA master of the recorded jobs, only needed
+                  to record them (default None)
+        path -- database file (default ~/.lava-ctl/results.db)
+        logger -- the logger class (default None)
+        """
+        super(ResultsStore, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.ResultsStore')
+        self._server = server
+        self._path = path or lavactl_dir('results.db')
+        with closing(self._connect()) as db:
+            db.executescript(self.SCHEMA)
+
+    @property
+    def path(self):
+        return self._path
+
+    def _connect(self):
+        return sqlite3.connect(self._path, timeout=self.LOCK_TIMEOUT)
+
+    def record_jobs(self, job_list, definition, name=None, device_types=None):
+        """Record the jobs created by the submission of a definition
+
+        arguments:
+        definition -- the job definition as a dictionary
+        name -- test set of the jobs (default None)
+        device_types -- device types of the jobs (default None)
+        """
+        images = self._images(definition)
+        tests = self._tests(definition)
+        device_type = ','.join(sorted(set(device_types or []))) or None
+        now = time.time()
+
+        with closing(self._connect()) as db:
+            with db:
+                for job_id in job_list:
+                    key = (self._server, str(job_id))
+                    db.execute(
+                        "INSERT OR REPLACE INTO jobs (server, id, name, "
+                        "device_type, kernel, rootfs, image, submitted) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        key + (name, device_type, images.get('kernel'),
+                               images.get('rootfs'), images.get('image'), now))
+                    db.executemany(
+                        "INSERT OR REPLACE INTO tests VALUES (?, ?, ?, ?, ?)",
+                        [key + test for test in tests])
+
+    def recording(self, job_id, pages, name=None):
+        """Record the test results of a job while they are read
+
+        Generates the same pages of test cases, storing each one as it goes
+        by. The results stored before for the job are replaced.
+
+        keyword arguments:
+        name -- test set of the job, if it wasn't recorded (default None)
+        """
+        key = (self._server, str(job_id))
+        count = 0
+        with closing(self._connect()) as db:
+            with db:
+                db.execute("DELETE FROM results WHERE server = ? AND "
+                           "job_id = ?", key)
+                db.execute("INSERT OR IGNORE INTO jobs (server, id) "
+                           "VALUES (?, ?)", key)
+                if name:
+                    db.execute("UPDATE jobs SET name = ? WHERE server = ? "
+                               "AND id = ? AND name IS NULL", (name,) + key)
+
+            for page in pages:
+                with db:
+                    db.executemany(
+                        "INSERT INTO results "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [key + self._row(case) for case in page])
+                count += len(page)
+                yield page
+
+            with db:
+                db.execute("UPDATE jobs SET recorded = ? WHERE server = ? "
+                           "AND id = ?", (time.time(),) + key)
+        self._logger.debug("Recorded %d results of job %s", count, job_id)
+
+    def failures(self, name=None, since=None, limit=None):
+        """Return the test cases that failed, most failed first
+
+        Each row has the test, the test case, the number of failures, the
+        number of runs and the last job in which it failed.
+
+        keyword arguments:
+        name -- only the jobs of test sets matching this LIKE pattern
+        since -- only the jobs after this time (as in time.time())
+        limit -- maximum number of rows (default None)
+        """
+        where, params = self._filter(name, since)
+        query = ("SELECT results.test, results.name, "
+                 "SUM(results.result = 'fail') AS failed, COUNT(*), "
+                 "MAX(CASE WHEN results.result = 'fail' "
+                 "THEN CAST(results.job_id AS INTEGER) END) "
+                 "FROM results JOIN jobs ON jobs.server = results.server "
+                 "AND jobs.id = results.job_id "
+                 "WHERE results.suite != 'lava' %s "
+                 "GROUP BY results.test, results.name HAVING failed > 0 "
+                 "ORDER BY failed DESC, results.test, results.name" % where)
+        return self._query(query, params, limit)
+
+    def flaky(self, name=None, since=None, limit=None):
+        """Return the test cases whose result changes from run to run
+
+        Each row has the test, the test case, the number of runs, the number
+        of failures, the number of times the result changed and the ratio of
+        changes between consecutive runs. The flakiest come first.
+        """
+        where, params = self._filter(name, since)
+        query = ("SELECT results.test, results.name, results.result "
+                 "FROM results JOIN jobs ON jobs.server = results.server "
+                 "AND jobs.id = results.job_id "
+                 "WHERE results.suite != 'lava' "
+                 "AND results.result IN ('pass', 'fail') %s "
+                 "ORDER BY results.test, results.name, %s, "
+                 "CAST(results.job_id AS INTEGER)" % (where, self.JOB_TIME))
+
+        flaky = []
+        with closing(self._connect()) as db:
+            cursor = db.execute(query, params)
+            for case, rows in groupby(cursor, key=lambda row: row[:2]):
+                results = [row[2] for row in rows]
+                changes = sum(1 for a, b in zip(results, results[1:]) if a != b)
+                if changes:
+                    flaky.append(case + (len(results), results.count('fail'),
+                                         changes,
+                                         float(changes) / (len(results) - 1)))
+
+        flaky.sort(key=lambda row: (-row[5], -row[2], row[:2]))
+        return flaky[:limit] if limit else flaky
+
+    def durations(self, test=None, name=None, since=None, limit=None):
+        """Return the seconds each test took in each job, oldest first
+
+        Each row has the test, the job, the time of the job, its device
+        types and the sum of the durations of the test cases.
+
+        keyword arguments:
+        test -- only the results of this test (default None)
+        """
+        where, params = self._filter(name, since)
+        if test:
+            where += " AND results.test = ?"
+            params.append(test)
+        query = ("SELECT results.test, results.job_id, %s, "
+                 "jobs.device_type, SUM(results.duration) "
+                 "FROM results JOIN jobs ON jobs.server = results.server "
+                 "AND jobs.id = results.job_id "
+                 "WHERE results.suite != 'lava' %s "
+                 "GROUP BY results.server, results.job_id, results.test "
+                 "ORDER BY results.test, 3" % (self.JOB_TIME, where))
+        return self._query(query, params, limit)
+
+    def test_durations(self, name, runs=None):
+        """Return the mean seconds each test of a test set took
+
+        Only the jobs of the test set run in the master of the store with
+        their results recorded are used, the last ones first.
+
+        keyword arguments:
+        runs -- maximum number of jobs averaged for each test (default None)
+        """
+        query = ("SELECT results.test, SUM(results.duration) "
+                 "FROM results JOIN jobs ON jobs.server = results.server "
+                 "AND jobs.id = results.job_id "
+                 "WHERE results.suite != 'lava' AND jobs.server = ? "
+                 "AND jobs.name = ? AND jobs.recorded IS NOT NULL "
+                 "GROUP BY results.job_id, results.test "
+                 "ORDER BY %s DESC, CAST(results.job_id AS INTEGER) DESC"
+                 % self.JOB_TIME)
+
+        samples = defaultdict(list)
+        for test, duration in self._query(query, (self._server, name)):
+            if duration is not None and (runs is None or
+                                         len(samples[test]) < runs):
+                samples[test].append(duration)
+        return dict((test, sum(values) / len(values))
+                    for test, values in samples.items())
+
+    def _filter(self, name, since):
+        where, params = "", []
+        if name:
+            where += " AND jobs.name LIKE ?"
+            params.append(name)
+        if since:
+            where += " AND %s >= ?" % self.JOB_TIME
+            params.append(since)
+        return where, params
+
+    def _query(self, query, params, limit=None):
+        if limit:
+            query += " LIMIT %d" % int(limit)
+        with closing(self._connect()) as db:
+            return db.execute(query, params).fetchall()
+
+    def _row(self, case):
+        return (case['suite'], test_name(case['suite']), case['name'],
+                case.get('result'), self._number(case.get('duration')),
+                self._number(case.get('measurement')), case.get('unit'),
+                str(case['logged']) if case.get('logged') else None)
+
+    def _number(self, value):
+        try:
+            return float(value) if value not in (None, '') else None
+        except (TypeError, ValueError):
+            return None
+
+    def _images(self, definition):
+        """Return the URLs of the images deployed by a definition"""
+        images = {}
+        for action in definition.get('actions') or []:
+            deploy = action.get('deploy') if isinstance(action, dict) else None
+            if not isinstance(deploy, dict):
+                continue
+            if isinstance(deploy.get('image'), dict):
+                images['image'] = deploy['image'].get('url')
+            for key, image in (deploy.get('images') or {}).items():
+                if isinstance(image, dict):
+                    images[key] = image.get('url')
+        return images
+
+    def _tests(self, definition):
+        """Return the name, repository and revision of every test"""
+        tests = []
+        for action in definition.get('actions') or []:
+            test = action.get('test') if isinstance(action, dict) else None
+            if not isinstance(test, dict):
+                continue
+            for test_def in test.get('definitions') or []:
+                repository = test_def.get('repository')
+                if test_def.get('from') != 'git':
+                    repository = test_def.get('from')
+                tests.append((test_def.get('name'), repository,
+                              test_def.get('revision')))
+        return tests
+
+    def __repr__(self):
+        return 'ResultsStore(%s, %s)' % (self._server, self._path)
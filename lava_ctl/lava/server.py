@@ -25,73 +25,724 @@ WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 import Queue
+import atexit
 import gzip
+import heapq
 import logging
 import os
+import re
 import sys
+import json
 import paramiko
 import shutil
 import signal
 import hashlib
 import socket
+import sqlite3
+import threading
+import time
 import xmlrpclib
-import yaml
 import zmq
 import urllib2
 import stat
 
+from collections import defaultdict, OrderedDict
+from multiprocessing.pool import ThreadPool
+
 from progress.bar import Bar
 from terminaltables import AsciiTable
 
+from lava_ctl import serialization
 from lava_ctl.config import ConfigManager
-from lava_ctl.utils import timeout, TimeoutError
+from lava_ctl.lava.journal import JobJournal
+from lava_ctl.lava.placement import DevicePlacement
+from lava_ctl.lava.polling import JobPoller
+from lava_ctl.lava.results import ResultsStore
+from lava_ctl.lava.streaming import ResultStream
+from lava_ctl.lava.validation import ValidationCache
+from lava_ctl.lava.transport import PooledTransport, RpcBatch
+from lava_ctl.utils import TimeoutError
+
+
+class JobFuture(object):
+    """Final status of a LAVA job that may not be known yet
+
+    Futures are created by JobListener.register() and resolved by the
+    listener thread once the job reaches one of the finished states, once
+    its deadline expires, or once the listener is closed.
+
+    """
+
+    def __init__(self, job_id, logger=None):
+        super(JobFuture, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.JobFuture')
+        self._job_id = job_id
+        self._status = None
+        self._deadline = None
+        self._timed_out = False
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._callbacks = []
+
+    @property
+    def job_id(self):
+        return self._job_id
+
+    @property
+    def status(self):
+        """Last known status of the job"""
+        return self._status
+
+    @property
+    def deadline(self):
+        """Time (as in time.time()) at which the wait for the job expires"""
+        return self._deadline
+
+    def done(self):
+        """Return True if the job finished or its deadline expired"""
+        return self._done.is_set()
+
+    def timed_out(self):
+        """Return True if the deadline expired before the job finished"""
+        return self._timed_out
+
+    def cancelled(self):
+        """Return True if the listener was closed before the job finished"""
+        return self._cancelled
+
+    def add_done_callback(self, callback):
+        """Call callback(future) when the job finishes or times out
+
+        The callback runs right away if the future is already done,
+        otherwise it runs on the listener thread.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def result(self, timeout=None):
+        """Wait for the job to finish and return its final status
+
+        Raises TimeoutError if the job didn't finish within timeout seconds,
+        before its deadline or before the listener was closed.
+        """
+        if not self._done.wait(timeout) or self._timed_out or self._cancelled:
+            raise TimeoutError()
+        return self._status
+
+    def _update(self, status, finished=False):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._status = status
+            if not finished:
+                return
+        self._resolve()
+
+    def _expire(self):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._timed_out = True
+        self._logger.warning("Timeout while waiting for job %s", self._job_id)
+        self._resolve()
+
+    def _cancel(self):
+        # The job didn't time out, nobody is listening for it anymore
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._cancelled = True
+        self._resolve()
+
+    def _resolve(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                self._logger.exception("Error in callback for job %s",
+                                       self._job_id)
 
 
 class JobListener(object):
     """Listens for the ZMQ notifications coming from the LAVA publisher.
 
-    Callbacks can be register for precessing messages
+    A single listener per publisher is shared by the whole process (see
+    JobListener.instance). It keeps one subscription open from a background
+    thread and multiplexes the notifications to the JobFuture of every
+    registered job.
+
+    The background thread never blocks in the socket: it polls it with a
+    zmq.Poller until the nearest job deadline, so the JobFuture of a job
+    that doesn't finish in time expires without relying on signals. All
+    the public methods are thread-safe.
+
+    Notifications about jobs that are not registered yet are kept while a
+    submission is in progress (see JobListener.expecting), so that jobs
+    finishing before their ID is known are not lost.
+
+    A busy publisher emits many notifications that are of no interest for
+    the listener. Those are dropped as early as possible: by topic at the
+    socket, and by job ID before decoding the payload. The counters of the
+    processed notifications are available through JobListener.stats().
 
     """
     FINISHED_JOB_STATUS = ["Complete", "Incomplete", "Canceled"]
 
-    def __init__(self, url, logger=None):
+    # Suffix of the topic used by the LAVA publisher for job notifications
+    JOB_TOPIC_SUFFIX = b".testjob"
+
+    # Extracts the job ID from a raw notification without decoding it
+    JOB_ID_REGEX = re.compile(br'"job"\s*:\s*"?([0-9.]+)')
+
+    # Maximum number of finished jobs remembered before being registered
+    MAX_UNCLAIMED = 1024
+
+    # Upper bound of a blocking wait in the calling thread. A bounded
+    # Queue.get keeps the thread responsive to KeyboardInterrupt.
+    MAX_WAIT = 365 * 24 * 3600
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, url, topic=None, journal=None, logger=None):
+        """Return the process-wide listener of the publisher at url"""
+        with cls._instances_lock:
+            if url not in cls._instances:
+                cls._instances[url] = cls(url, topic=topic, journal=journal,
+                                          logger=logger)
+            return cls._instances[url]
+
+    @classmethod
+    def close_all(cls):
+        """Close every listener of the process at exit
+
+        Nobody waits for the jobs anymore, so their futures are left
+        pending: they neither time out nor run their callbacks.
+        """
+        with cls._instances_lock:
+            listeners = cls._instances.values()
+        for listener in listeners:
+            listener.close(cancel=False)
+
+    def __init__(self, url, topic=None, journal=None, logger=None):
+        """JobListener initializer
+
+        keyword arguments:
+        url -- ZMQ URL of the LAVA publisher
+        topic -- full topic of the job notifications, for example
+                 'org.linaro.validation.testjob'. When None, every topic is
+                 received and the ones not ending in '.testjob' are dropped.
+        journal -- JobJournal where the notifications of the registered
+                   jobs are recorded (default None)
+        logger -- the logger class (default None)
+        """
         super(JobListener, self).__init__()
         self._logger = logger or logging.getLogger(__name__ + '.JobListener')
+        self._url = url
+        self._journal = journal
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._unclaimed = {}
+        self._expecting = 0
+        self._deadlines = []
+        self._closed = False
+        self._cancel_pending = True
+        self._stats = dict.fromkeys(['received', 'dropped_topic',
+                                     'dropped_job', 'errors', 'dispatched'], 0)
+
         self._ctx = zmq.Context.instance()
         self._sub = self._ctx.socket(zmq.SUB)
-        self._sub.setsockopt(zmq.SUBSCRIBE, b"")
+        self._sub.setsockopt(zmq.SUBSCRIBE, topic.encode() if topic else b"")
         self._sub.connect(url)
 
-    def wait(self, job_list, seconds=None):
-        def loop():
-            status = dict([(id, None) for id in job_list])
-            while True:
-                try:
-                    msg = self._sub.recv_multipart()
-                    (topic, uuid, dt, username, data) = msg[:]
+        # Used to interrupt the poller when a closer deadline is registered
+        wakeup_url = 'inproc://lava-ctl-listener-%x' % id(self)
+        self._wakeup_lock = threading.Lock()
+        self._wakeup_recv = self._ctx.socket(zmq.PAIR)
+        self._wakeup_recv.bind(wakeup_url)
+        self._wakeup_send = self._ctx.socket(zmq.PAIR)
+        self._wakeup_send.connect(wakeup_url)
+
+        self._thread = threading.Thread(target=self._listen,
+                                        name='JobListener(%s)' % url)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self, cancel=True):
+        """Stop listening
+
+        keyword arguments:
+        cancel -- cancel the futures of the pending jobs, otherwise they
+                  are left pending (default True)
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._cancel_pending = cancel
+        self._wakeup()
+        self._thread.join()
+
+        with self._instances_lock:
+            if self._instances.get(self._url) is self:
+                del self._instances[self._url]
+
+    def stats(self):
+        """Return the counters of the processed notifications
+
+        received -- notifications read from the socket
+        dropped_topic -- dropped because of their topic
+        dropped_job -- dropped because their job is not tracked
+        errors -- notifications that couldn't be processed
+        dispatched -- notifications delivered to a JobFuture
+        """
+        return dict(self._stats)
+
+    def expecting(self):
+        """Context manager to wrap a job submission
+
+        While active, notifications of unregistered jobs are kept so that
+        they can be claimed by register() once the job ID is known.
+        """
+        listener = self
 
-                    data = yaml.safe_load(data)
-                    self._logger.debug("[ZMQ]:\n%s", yaml.dump(
-                        data, default_flow_style=False))
+        class Expecting(object):
+            def __enter__(self):
+                with listener._lock:
+                    listener._expecting += 1
 
-                    # filter message from different job
-                    if "job" in data and data["job"] in job_list:
-                        status[data["job"]] = data["status"]
-                        self._logger.debug(
-                            "Job ID %s -- status: %s", data["job"], data["status"])
+            def __exit__(self, type, value, traceback):
+                with listener._lock:
+                    listener._expecting -= 1
+                    if not listener._expecting:
+                        listener._unclaimed.clear()
 
-                except Exception:
-                    status = None
+        return Expecting()
 
-                if all([s in self.FINISHED_JOB_STATUS for s in status.values()]):
-                    return all([s == "Complete" for s in status.values()])
+    def register(self, job_id, callback=None, deadline=None):
+        """Start tracking a job and return its JobFuture
+
+        Registering an already tracked job returns the same future. Its
+        deadline is only ever brought forward.
+
+        keyword arguments:
+        callback -- called as callback(future) when the job finishes
+        deadline -- time (as in time.time()) after which the future expires
+                    (default None, wait forever)
+        """
+        key = str(job_id)
+        wakeup = False
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = JobFuture(job_id, logger=self._logger)
+                self._futures[key] = future
+            status = self._unclaimed.pop(key, None)
+
+            if deadline is not None and not future.done() and \
+                    (future._deadline is None or deadline < future._deadline):
+                future._deadline = deadline
+                wakeup = not self._deadlines or deadline < self._deadlines[0][0]
+                heapq.heappush(self._deadlines, (deadline, key))
+
+        if wakeup:
+            self._wakeup()
+
+        if status is not None:
+            future._update(status, status in self.FINISHED_JOB_STATUS)
+
+        if callback:
+            future.add_done_callback(callback)
+
+        return future
+
+    def pending(self):
+        """Return the IDs of the registered jobs that are not done yet"""
+        with self._lock:
+            return [future.job_id for future in self._futures.values()
+                    if not future.done()]
+
+    def notify(self, job_id, status):
+        """Update the status of a job obtained by other means
+
+        This is useful to feed the status returned by scheduler.job_status
+        for jobs whose notifications may have been missed.
+        """
+        self._dispatch(job_id, status)
+
+    def wait(self, job_list, seconds=None, callback=None, deadlines=None):
+        """Wait until all the jobs in job_list reach a finished state
+
+        Returns True if all of them completed before their deadlines. This
+        method can be called concurrently from any number of threads.
+
+        keyword arguments:
+        seconds -- maximum time to wait for the jobs (default None)
+        callback -- called as callback(job_id, status) from the calling
+                    thread as soon as each job finishes or times out
+                    (default None)
+        deadlines -- dictionary with an individual deadline (as in
+                     time.time()) for some of the jobs (default None)
+        """
+        deadline = None if seconds is None else time.time() + seconds
+        deadlines = deadlines or {}
+        finished = Queue.Queue()
 
+        futures = []
+        for id in job_list:
+            job_deadline = min([d for d in [deadline, deadlines.get(id)]
+                                if d is not None] or [None])
+            future = self.register(id, deadline=job_deadline)
+            future.add_done_callback(finished.put)
+            futures.append(future)
+
+        for _ in futures:
+            # Expired futures are resolved by the listener thread, the
+            # timeout here only guards against it having died
+            future = finished.get(timeout=self.MAX_WAIT)
+
+            if callback:
+                callback(future.job_id, future.status)
+
+        return all([f.status == "Complete" and not f.timed_out()
+                    for f in futures])
+
+    def _wakeup(self):
+        with self._wakeup_lock:
+            self._wakeup_send.send(b'')
+
+    def _listen(self):
+        poller = zmq.Poller()
+        poller.register(self._sub, zmq.POLLIN)
+        poller.register(self._wakeup_recv, zmq.POLLIN)
+
+        while not self._closed:
+            try:
+                events = dict(poller.poll(self._poll_timeout()))
+            except zmq.ContextTerminated:
+                break
+
+            if self._wakeup_recv in events:
+                while self._wakeup_recv.poll(0):
+                    self._wakeup_recv.recv()
+
+            if self._sub in events:
+                self._receive()
+
+            self._expire()
+
+        if self._cancel_pending:
+            for future in self._futures.values():
+                future._cancel()
+
+        self._sub.close(linger=0)
+        self._wakeup_recv.close(linger=0)
+        self._wakeup_send.close(linger=0)
+
+    def _poll_timeout(self):
+        """Milliseconds until the nearest deadline, None for no deadline"""
+        with self._lock:
+            if not self._deadlines:
+                return None
+            return max(0, int((self._deadlines[0][0] - time.time()) * 1000) + 1)
+
+    def _receive(self):
+        """Process all the queued notifications without blocking"""
+        stats = self._stats
+        while True:
+            try:
+                msg = self._sub.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+
+            stats['received'] += 1
+            try:
+                (topic, uuid, dt, username, data) = msg[:]
+
+                if not topic.endswith(self.JOB_TOPIC_SUFFIX):
+                    stats['dropped_topic'] += 1
+                    continue
+
+                match = self.JOB_ID_REGEX.search(data)
+                if match and not self._tracked(match.group(1)):
+                    stats['dropped_job'] += 1
+                    continue
+
+                self._logger.debug("[ZMQ]: %s %s", topic, data)
+                data = self._decode(data)
+
+                if "job" in data:
+                    self._dispatch(data["job"], data["status"])
+                    stats['dispatched'] += 1
+                else:
+                    stats['dropped_job'] += 1
+
+            except Exception:
+                stats['errors'] += 1
+                self._logger.exception("Error processing LAVA notification")
+
+    def _tracked(self, job_id):
+        """Return True if the notifications of job_id are of interest"""
+        with self._lock:
+            if self._expecting:
+                return True
+            future = self._futures.get(job_id)
+            return future is not None and not future.done()
+
+    def _decode(self, data):
+        """Decode the payload of a notification
+
+        The LAVA publisher sends JSON, YAML is only a fallback.
+        """
         try:
-            wait = timeout(seconds=seconds)(loop)
-            return wait()
-        except TimeoutError:
+            return json.loads(data)
+        except ValueError:
+            return serialization.load(data)
+
+    def _expire(self):
+        """Expire the futures whose deadline has passed"""
+        now = time.time()
+        expired = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                deadline, key = heapq.heappop(self._deadlines)
+                future = self._futures[key]
+                if future._deadline == deadline:
+                    expired.append(future)
+
+        for future in expired:
+            future._expire()
+
+    def _dispatch(self, job_id, status):
+        key = str(job_id)
+        finished = status in self.FINISHED_JOB_STATUS
+
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                if self._expecting and len(self._unclaimed) < self.MAX_UNCLAIMED:
+                    self._unclaimed[key] = status
+                return
+
+        self._logger.debug("Job ID %s -- status: %s", job_id, status)
+        if self._journal and future.status != status:
+            self._journal.record_status(job_id, status)
+        future._update(status, finished)
+
+
+class SubmissionWindow(object):
+    """Bounds the number of jobs that are in flight at the same time
+
+    A job is in flight from its submission until its JobFuture is done.
+    acquire() blocks the submitting thread while the jobs in flight reach
+    the global limit or the limit of one of the device types, and the slots
+    are given back from the JobListener thread as the jobs finish. This
+    keeps the devices busy without flooding the master with jobs.
+
+    A submission bigger than a limit is let through when nothing else is
+    in flight, so that it can't block forever.
+
+    """
+    class Closed(RuntimeError):
+        pass
+
+    # Seconds between checks for KeyboardInterrupt while blocked
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, max_in_flight=None, per_device_type=None, logger=None):
+        """SubmissionWindow initializer
+
+        keyword arguments:
+        max_in_flight -- maximum number of jobs in flight (default None,
+                         unlimited)
+        per_device_type -- dictionary with the maximum number of jobs in
+                           flight of some device types (default None)
+        logger -- the logger class (default None)
+        """
+        super(SubmissionWindow, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.SubmissionWindow')
+        self._max = max_in_flight
+        self._per_device_type = dict(per_device_type or {})
+        self._in_flight = 0
+        self._in_flight_by_type = defaultdict(int)
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def in_flight(self):
+        """Number of jobs in flight"""
+        return self._in_flight
+
+    def acquire(self, device_types):
+        """Wait until the jobs of a submission fit in the window
+
+        arguments:
+        device_types -- list with the device type of every job created by
+                        the submission
+
+        Returns the ticket to give to release() once the jobs are done.
+        Raises SubmissionWindow.Closed once close() is called.
+        """
+        ticket = self._ticket(device_types)
+
+        with self._cond:
+            if not self._fits(ticket):
+                self._logger.debug("%d jobs in flight, waiting to submit "
+                                   "more", self._in_flight)
+                while not self._fits(ticket) and not self._closed:
+                    self._cond.wait(self.POLL_INTERVAL)
+
+            if self._closed:
+                raise self.Closed("No more jobs can be submitted")
+            self._in_flight += sum(ticket.values())
+            for device_type, count in ticket.items():
+                self._in_flight_by_type[device_type] += count
+        return ticket
+
+    def exchange(self, ticket, device_types):
+        """Move the slots of a ticket to other device types without waiting
+
+        Used when a job is placed on other device types after acquire().
+        Returns the new ticket to give to release().
+        """
+        new_ticket = self._ticket(device_types)
+
+        with self._cond:
+            self.release(ticket)
+            self._in_flight += sum(new_ticket.values())
+            for device_type, count in new_ticket.items():
+                self._in_flight_by_type[device_type] += count
+        return new_ticket
+
+    def release(self, ticket):
+        """Give back the slots taken by acquire()"""
+        with self._cond:
+            self._in_flight -= sum(ticket.values())
+            for device_type, count in ticket.items():
+                self._in_flight_by_type[device_type] -= count
+            self._cond.notify_all()
+
+    def close(self):
+        """Refuse any further submission, also the ones waiting"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _ticket(self, device_types):
+        ticket = defaultdict(int)
+        for device_type in device_types:
+            ticket[device_type] += 1
+        return dict(ticket)
+
+    def _fits(self, ticket):
+        if not self._in_flight:
+            return True
+        if self._max is not None and \
+                self._in_flight + sum(ticket.values()) > self._max:
             return False
+        for device_type, count in ticket.items():
+            limit = self._per_device_type.get(device_type)
+            if limit is not None and \
+                    self._in_flight_by_type[device_type] + count > limit:
+                return False
+        return True
+
+
+class FailFast(object):
+    """Cancels the jobs of a run as soon as one of them fails
+
+    The jobs given to watch() are followed through their JobFuture. Once
+    one of them finishes in any state but Complete, or doesn't finish in
+    time, or fail() is called because of a failed test, every watched job
+    that is not finished yet is canceled. Jobs watched afterwards are
+    canceled right away.
+
+    The jobs that finish are followed from the JobListener thread, so the
+    cancellation they trigger runs in a thread of its own and doesn't hold
+    up the notifications of the other jobs.
+
+    """
+
+    def __init__(self, lava_server, logger=None):
+        """FailFast initializer
+
+        keyword arguments:
+        lava_server -- LavaServer of the jobs
+        logger -- the logger class (default None)
+        """
+        super(FailFast, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.FailFast')
+        self._lava_server = lava_server
+        self._listener = lava_server.listener()
+        self._lock = threading.Lock()
+        self._jobs = []
+        self._failed = threading.Event()
+
+    @property
+    def failed(self):
+        """True once the jobs have been canceled"""
+        return self._failed.is_set()
+
+    def watch(self, job_list):
+        """Cancel the jobs in job_list if any job of the run fails"""
+        with self._lock:
+            self._jobs.extend(job_list)
+
+        if self.failed:
+            self._cancel(job_list)
+            return
+
+        for id in job_list:
+            self._listener.register(id).add_done_callback(self._done)
+
+    def fail(self, reason):
+        """Cancel every watched job that didn't finish yet"""
+        with self._lock:
+            if self._failed.is_set():
+                return
+            self._failed.set()
+            jobs = list(self._jobs)
+
+        self._logger.error("%s, canceling the remaining jobs", reason)
+        self._lava_server.stop_submissions()
+        self._cancel(jobs)
+
+    def _done(self, future):
+        if future.cancelled() or self.failed:
+            return
+        elif future.timed_out():
+            self._fail_async("Job %s did not finish in time" % future.job_id)
+        elif future.status != 'Complete':
+            self._fail_async("Job %s finished %s" % (future.job_id,
+                                                     future.status))
+
+    def _fail_async(self, reason):
+        thread = threading.Thread(target=self.fail, args=(reason,),
+                                  name='FailFast')
+        thread.daemon = True
+        thread.start()
+
+    def _cancel(self, job_list):
+        pending = [id for id in job_list
+                   if not self._listener.register(id).done()]
+        # The notifications of the canceled jobs are not needed
+        for id in self._lava_server.cancel_jobs(pending):
+            self._listener.notify(id, 'Canceled')
+
+
+# The listener threads must be stopped before the interpreter tears down
+# the modules they use
+atexit.register(JobListener.close_all)
+atexit.register(JobPoller.close_all)
 
 
 class LavaServer(object):
@@ -118,9 +769,25 @@ class LavaServer(object):
     class LavaServerError(RuntimeError):
         pass
 
+    # Number of test cases fetched per call when reading the results
+    RESULTS_PAGE_SIZE = 500
+
+    # Seconds between polls of the results of the jobs watched by a FailFast
+    # when lava.server.results.stream_interval is not set
+    FAIL_FAST_STREAM_INTERVAL = 30
+
+    # Ways to learn about the status of the jobs
+    WAITERS = ['auto', 'publisher', 'polling']
+
+    # Seconds to wait for a connection to the publisher to detect it
+    PUBLISHER_PROBE_TIMEOUT = 5
+
     def __init__(self, config=None, logger=None):
         super(LavaServer, self).__init__()
         self._logger = logger or logging.getLogger(__name__ + '.LavaServer')
+        # threads fetching the results, created on the first use
+        self._pool = None
+        self._pool_lock = threading.Lock()
         self.read_config(config or ConfigManager())
 
     def read_config(self, config):
@@ -172,29 +839,141 @@ class LavaServer(object):
 
         rpcurl = self._url + 'RPC2'
         self._logger.debug('LAVA Master XML-RPC: %s', rpcurl)
-        self._rpc = xmlrpclib.ServerProxy(rpcurl)
+
+        # keep-alive connections shared by all the threads
+        connections, gzip_threshold = 4, None
+        if config.has('lava.server.rpc.connections'):
+            connections = int(config.get('lava.server.rpc.connections'))
+        if config.has('lava.server.rpc.gzip_threshold'):
+            gzip_threshold = int(config.get('lava.server.rpc.gzip_threshold'))
+        self._connections = connections
+        self._paged_results = True
+        self._transport = PooledTransport(connections=connections,
+                                          gzip_threshold=gzip_threshold,
+                                          logger=self._logger)
+        self._rpc = xmlrpclib.ServerProxy(rpcurl, transport=self._transport)
 
         # Store the publisher url
-        self._pub_url = 'tcp://%s:%s' % (host,
-                                         int(config.get('lava.publisher.port')))
+        self._pub_addr = (host, int(config.get('lava.publisher.port')))
+        self._pub_url = 'tcp://%s:%s' % self._pub_addr
+        self._pub_topic = None
+        if config.has('lava.publisher.topic'):
+            self._pub_topic = config.get('lava.publisher.topic')
+
+        # publisher notifications, polling of the scheduler or the first
+        # that works
+        self._waiter = 'auto'
+        if config.has('lava.server.jobs.waiter'):
+            self._waiter = config.get('lava.server.jobs.waiter')
+        if self._waiter not in self.WAITERS:
+            raise RuntimeError("Unknown waiter", self._waiter)
+        self._max_poll_interval = None
+        if config.has('lava.server.jobs.max_poll_interval'):
+            self._max_poll_interval = int(
+                config.get('lava.server.jobs.max_poll_interval'))
 
         # timeout for the job
         self._timeout = int(config.get('lava.server.jobs.timeout'))
 
+        # journal of the submitted jobs, an empty path disables it
+        journal_path = None
+        if config.has('lava.server.jobs.journal'):
+            journal_path = config.get('lava.server.jobs.journal')
+        journal_runs = None
+        if config.has('lava.server.jobs.journal_runs'):
+            journal_runs = int(config.get('lava.server.jobs.journal_runs'))
+        self._journal = None
+        if journal_path != '':
+            self._journal = JobJournal(journal_path, max_runs=journal_runs,
+                                       logger=self._logger)
+
+        # local database of the results, an empty path disables it
+        results_path = None
+        if config.has('lava.server.results.database'):
+            results_path = config.get('lava.server.results.database')
+        self._results = None
+        if results_path != '':
+            try:
+                self._results = ResultsStore(self._base_url, results_path,
+                                             logger=self._logger)
+            except sqlite3.Error, exc:
+                self._logger.warning('Results database disabled - %s', exc)
+
+        # seconds between polls of the results of the running jobs
+        self._stream_interval = None
+        if config.has('lava.server.results.stream_interval'):
+            self._stream_interval = int(
+                config.get('lava.server.results.stream_interval')) or None
+
+        # limits of the jobs submitted and not finished yet
+        self._window = None
+        if (config.has('lava.server.jobs.max_in_flight') or
+                config.has('lava.server.jobs.max_in_flight_per_device_type')):
+            max_in_flight, per_device_type = None, None
+            if config.has('lava.server.jobs.max_in_flight'):
+                max_in_flight = int(config.get('lava.server.jobs.max_in_flight'))
+            if config.has('lava.server.jobs.max_in_flight_per_device_type'):
+                per_device_type = config.get(
+                    'lava.server.jobs.max_in_flight_per_device_type')
+            self._window = SubmissionWindow(max_in_flight, per_device_type,
+                                            logger=self._logger)
+
         try:
-            version = self._rpc.system.version()
+            self._version = self._rpc.system.version()
             self._logger.debug('Connected to LAVA Master')
-            self._logger.debug('LAVA Master VERSION %s', version)
+            self._logger.debug('LAVA Master VERSION %s', self._version)
         except xmlrpclib.ProtocolError, err:
             self._logger.error('Error while connecting to LAVA Master - %s %s',
                                err.errcode, err.errmsg)
             raise err
 
+        # definitions already validated by this master
+        self._validation_cache = None
+        if (not config.has('lava.server.validation.cache')
+                or config.get('lava.server.validation.cache')):
+            ttl = None
+            if config.has('lava.server.validation.ttl'):
+                ttl = int(config.get('lava.server.validation.ttl'))
+            try:
+                self._validation_cache = ValidationCache(
+                    self._base_url, self._version, ttl=ttl,
+                    logger=self._logger)
+            except OSError, exc:
+                self._logger.warning('Validation cache disabled - %s', exc)
+
+        # groups of equivalent device types to choose from when submitting
+        self._placement = None
+        if config.has('lava.placement.groups'):
+            ttl = None
+            if config.has('lava.placement.ttl'):
+                ttl = int(config.get('lava.placement.ttl'))
+            self._placement = DevicePlacement(
+                self, config.get('lava.placement.groups'), ttl=ttl,
+                logger=self._logger)
+
+    @property
+    def version(self):
+        """Version of the LAVA master"""
+        return self._version
+
+    @property
+    def timeout(self):
+        """Maximum number of seconds to wait for a job"""
+        return self._timeout
+
     def validate(self, job_definition):
         """Validate a job definition"""
+        job_definition = str(job_definition)
+        cache = self._validation_cache
+        if cache and cache.valid(job_definition):
+            self._logger.debug("Job definition already validated")
+            return True
+
         try:
-            self._rpc.scheduler.validate_yaml(str(job_definition))
+            self._rpc.scheduler.validate_yaml(job_definition)
             self._logger.debug("Job definition validated")
+            if cache:
+                cache.add(job_definition)
             return True
         except xmlrpclib.Fault, flt:
             self._logger.error("Job validation error - %s %s",
@@ -205,38 +984,367 @@ class LavaServer(object):
                                err.errcode, err.errmsg)
             raise err
 
+    def validate_all(self, job_definitions):
+        """Validate several job definitions with a few round trips
+
+        Returns a list with the validity of each definition. Definitions
+        found in the validation cache are not sent to the master.
+        """
+        cache = self._validation_cache
+        batch = self.batch()
+        calls = []
+        for job_definition in job_definitions:
+            job_definition = str(job_definition)
+            if cache and cache.valid(job_definition):
+                calls.append(None)
+            else:
+                calls.append(batch.call('scheduler.validate_yaml',
+                                        job_definition))
+        batch.flush()
+
+        valid = []
+        for job_definition, call in zip(job_definitions, calls):
+            if call is None:
+                valid.append(True)
+            elif call.fault():
+                self._logger.error("Job validation error - %s %s",
+                                   call.fault().faultCode,
+                                   call.fault().faultString)
+                valid.append(False)
+            else:
+                if cache:
+                    cache.add(str(job_definition))
+                valid.append(True)
+
+        hits = calls.count(None)
+        if hits:
+            self._logger.debug("%d job definitions already validated", hits)
+        return valid
+
+    def device_availability(self):
+        """Return the devices available for each device type
+
+        The result maps the name of each device type to a tuple with its
+        number of idle devices, the number of jobs waiting for it and its
+        number of online devices. Returns None if the master can't tell.
+        """
+        batch = self.batch()
+        device_types = batch.call('scheduler.all_device_types')
+        pending = batch.call('scheduler.pending_jobs_by_device_type')
+        batch.flush()
+
+        for call in [device_types, pending]:
+            if call.fault():
+                self._logger.warning("Device availability not available - "
+                                     "%s %s", call.fault().faultCode,
+                                     call.fault().faultString)
+                return None
+
+        queues = pending.result()
+        availability = {}
+        for device_type in device_types.result():
+            name = device_type['name']
+            idle = int(device_type.get('idle', 0))
+            online = idle + int(device_type.get('busy', 0))
+            availability[name] = (idle, int(queues.get(name, 0)), online)
+        self._logger.debug("Device availability: %s", availability)
+        return availability
+
+    def place(self, definition):
+        """Choose the device types of a job definition (a dictionary)
+
+        Returns True if the definition was moved to other device types of
+        the groups in lava.placement.groups. See DevicePlacement.
+        """
+        if self._placement is None:
+            return False
+        return self._placement.place(definition)
+
+    def batch(self, max_calls=100):
+        """Return an RpcBatch to send several calls in a few round trips"""
+        return RpcBatch(self._rpc, max_calls=max_calls, logger=self._logger)
+
     def check_tests_results(self, job_list):
-        """Check if all the tests of a job are passed"""
+        """Check if all the tests of the jobs are passed
+
+        The results of the jobs are fetched concurrently and each job is
+        reported in a single table once all its results arrive. Where the
+        server supports it, they are fetched suite by suite in pages of
+        RESULTS_PAGE_SIZE test cases, so no RPC reply holds the whole
+        results of a job. Each page is counted and recorded as it arrives,
+        only the rows of the table of a job are kept until it's logged.
+        """
+        # The suites of all the jobs in a single round trip
+        batch = self.batch()
+        suites = [batch.call('results.get_testjob_suites_list_yaml', id)
+                  for id in job_list]
+        batch.flush()
+
         self._logger.info("=== BEGIN TEST REPORT ===")
-        success = []
-        for id in job_list:
-            self._logger.info("%s: %s/scheduler/job/%s",
-                              id, self._base_url, id)
-            yaml_report = self._rpc.results.get_testjob_results_yaml(id)
+        # A bounded wait keeps the thread responsive to KeyboardInterrupt
+        counts = self._thread_pool().map_async(
+            lambda args: self._report_results(*args),
+            zip(job_list, suites)).get(JobListener.MAX_WAIT)
 
-            results_table = [['Test Suite', 'Test Name', 'Result']]
-            for test in yaml.load(yaml_report):
-                results_table.append(
-                    [test['suite'], test['name'], test['result']])
+        # the jobs of a sharded test set are reported as a whole as well
+        total = defaultdict(int)
+        for job_counts in counts:
+            for result, count in job_counts.items():
+                total[result] += count
+        if len(job_list) > 1:
+            self._logger.info("TOTAL PASSED %d", total['pass'])
+            self._logger.info("TOTAL FAILED %d", total['fail'])
+        self._logger.info("=== END TEST REPOST ===")
+
+        return all(result == 'pass'
+                   for result, count in total.items() if count)
+
+    def _report_results(self, job_id, suites):
+        """Log the results of a job and return the number of tests by result
+
+        arguments:
+        suites -- RpcCall of results.get_testjob_suites_list_yaml
+        """
+        counts = defaultdict(int)
+        results_table = [('Test Suite', 'Test Name', 'Result')]
+        tabulate = self._logger.isEnabledFor(logging.INFO)
+        pages = self._results_pages(job_id, suites)
+        if self._results:
+            pages = self._results.recording(job_id, pages)
+        for page in pages:
+            for test in page:
+                if tabulate:
+                    results_table.append(
+                        (test['suite'], test['name'], test['result']))
+                counts[test['result']] += 1
+
+        if len(results_table) > 1:
             table = AsciiTable(results_table)
-            self._logger.info("Results Table:\n%s", table.table)
+            self._logger.info("Results Table of job %s:\n%s",
+                              job_id, table.table)
 
-            results = [row[2] for row in results_table[1:]]
-            self._logger.info("PASSED %d", results.count('pass'))
-            self._logger.info("FAILED %d", results.count('fail'))
+        self._logger.info("%s: %s/scheduler/job/%s",
+                          job_id, self._base_url, job_id)
+        self._logger.info("PASSED %d", counts['pass'])
+        self._logger.info("FAILED %d", counts['fail'])
 
-            success.append(all(result == "pass" for result in results))
+        return counts
 
-        self._logger.info("=== END TEST REPOST ===")
-        return all(success)
+    def _results_pages(self, job_id, suites):
+        """Generate the test results of a job in pages
 
-    def submit(self, job_definition, wait=True):
-        """Submit a job to the LAVA server"""
-        job_id = self._rpc.scheduler.submit_job(str(job_definition))
+        Servers without paging support get the whole results of the job in
+        a single page.
+        """
+        if suites.fault() is None and self._paged_results:
+            paged = False
+            try:
+                for suite in serialization.load(suites.result()):
+                    for page in self._suite_pages(job_id, suite['name']):
+                        paged = True
+                        yield page
+                return
+            except xmlrpclib.Fault, flt:
+                if paged:
+                    raise
+                self._logger.debug("Paged results not available - %s %s",
+                                   flt.faultCode, flt.faultString)
+                self._paged_results = False
+
+        yield serialization.load(
+            self._rpc.results.get_testjob_results_yaml(job_id))
+
+    def _suite_pages(self, job_id, suite):
+        """Generate the test results of a suite in pages"""
+        offset = 0
+        while True:
+            page = serialization.load(
+                self._rpc.results.get_testsuite_results_yaml(
+                    job_id, suite, self.RESULTS_PAGE_SIZE, offset)) or []
+            yield page
+
+            if len(page) < self.RESULTS_PAGE_SIZE:
+                return
+            offset += len(page)
+
+    def stream_results(self, job_list, callback=None, interval=None):
+        """Return a ResultStream of the jobs to wrap the wait for them
+
+        The test cases are reported while the jobs run every
+        lava.server.results.stream_interval seconds, if set.
+
+        keyword arguments:
+        callback -- called as callback(job_id, test_case) for every test
+                    case reported (default None)
+        interval -- seconds between polls when stream_interval is not set
+                    (default None, no stream)
+        """
+        return ResultStream(self, job_list, self._stream_interval or interval,
+                            callback=callback, logger=self._logger)
 
+    def _thread_pool(self):
+        """Return the pool of threads to fetch the results of the jobs"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPool(max(1, self._connections))
+            return self._pool
+
+    def close(self):
+        """Release the resources of the server that outlive a call"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def log_stats(self):
+        """Log the statistics of the JobListener and of the RPC calls"""
+        if not self._logger.isEnabledFor(logging.DEBUG):
+            return
+
+        self._logger.debug("JobListener stats: %s", self.listener().stats())
+        for method, stats in sorted(self._transport.stats().items()):
+            self._logger.debug("RPC %s: %d calls, %.3fs total, %.3fs max, "
+                               "%d errors", method, stats['calls'],
+                               stats['total'], stats['max'], stats['errors'])
+
+    @property
+    def results(self):
+        """ResultsStore where the results are recorded (may be None)"""
+        return self._results
+
+    @property
+    def journal(self):
+        """JobJournal where the submitted jobs are recorded (may be None)"""
+        return self._journal
+
+    def listener(self):
+        """Return the JobListener of the LAVA publisher
+
+        When the jobs are polled (see lava.server.jobs.waiter), a JobPoller
+        feeds the listener with the status of the jobs.
+        """
+        listener = JobListener.instance(self._pub_url, topic=self._pub_topic,
+                                        journal=self._journal,
+                                        logger=self._logger)
+        if self._waiter == 'auto':
+            self._waiter = 'publisher' if self._publisher_reachable() \
+                else 'polling'
+        if self._waiter == 'polling':
+            JobPoller.instance(self, listener,
+                               max_interval=self._max_poll_interval,
+                               logger=self._logger)
+        return listener
+
+    def _publisher_reachable(self):
+        """Return True if a connection to the publisher can be opened"""
+        try:
+            conn = socket.create_connection(
+                self._pub_addr, timeout=self.PUBLISHER_PROBE_TIMEOUT)
+            conn.close()
+            return True
+        except (socket.error, socket.timeout), exc:
+            self._logger.warning("LAVA publisher %s unreachable (%s), polling "
+                                 "the status of the jobs", self._pub_url, exc)
+            return False
+
+    def submit_job(self, job_definition, name=None, definition=None):
+        """Submit a job to the LAVA server without waiting for it
+
+        Returns the list of job IDs created by the submission. Multinode
+        definitions create one job per role. The jobs are registered in the
+        JobListener before returning, so their notifications are never lost,
+        with a deadline of lava.server.jobs.timeout seconds from now.
+
+        With lava.server.jobs.max_in_flight or
+        lava.server.jobs.max_in_flight_per_device_type, the submission waits
+        until enough of the jobs submitted before finish.
+
+        With lava.placement.groups, the job is placed on the best equivalent
+        device types once it fits in the window, so that the placement is
+        not outdated by the wait. A definition moved to other device types is
+        validated again. The definition dictionary is modified in place.
+
+        keyword arguments:
+        name -- name to record the job with in the journal (default None)
+        definition -- the job definition as a dictionary, read from
+                      job_definition when None (default None)
+        """
+        if definition is None and (self._window or self._results or
+                                   self._placement):
+            definition = serialization.load(str(job_definition))
+
+        ticket = None
+        if self._window:
+            ticket = self._window.acquire(self.device_types(definition))
+
+        listener = self.listener()
+        try:
+            if self.place(definition):
+                job_definition = serialization.dump(definition)
+                # a definition valid for a device type may not be for another
+                if not self.validate(job_definition):
+                    raise self.LavaServerError(
+                        "Invalid job for the device types it was placed on")
+                if ticket:
+                    ticket = self._window.exchange(
+                        ticket, self.device_types(definition))
+
+            with listener.expecting():
+                job_id = self._rpc.scheduler.submit_job(str(job_definition))
+                deadline = time.time() + self._timeout
+                job_list = self._job_list(job_id)
+                if self._journal:
+                    self._journal.record_submit(job_list, name=name)
+                if self._results:
+                    self._results.record_jobs(
+                        job_list, definition, name=name,
+                        device_types=self.device_types(definition))
+                futures = [listener.register(id, deadline=deadline)
+                           for id in job_list]
+        except:
+            if ticket:
+                self._window.release(ticket)
+            raise
+
+        if ticket:
+            self._release_when_done(ticket, futures)
+
+        return job_list
+
+    @staticmethod
+    def device_types(definition):
+        """Return the device type of every job of a definition (a dictionary)
+
+        Multinode definitions create one job per device of each role.
+        """
+        roles = definition.get('protocols', {}).get('lava-multinode', {})
+        roles = roles.get('roles') or {}
+        if roles:
+            return [role.get('device_type') for role in roles.values()
+                    for _ in range(int(role.get('count', 1)))]
+        return [definition.get('device_type')]
+
+    def _release_when_done(self, ticket, futures):
+        """Give back the slots of a submission once all its jobs are done"""
+        lock = threading.Lock()
+        pending = [len(futures)]
+
+        def done(future):
+            with lock:
+                pending[0] -= 1
+                if pending[0]:
+                    return
+            self._window.release(ticket)
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def _job_list(self, job_id):
+        """Log the job URLs and return the list of submitted job IDs"""
         if not job_id:
             self._logger.error("Error at submitting the LAVA job")
-            raise LavaServerError("Couldn't submit the job to the LAVA master")
+            raise self.LavaServerError("Couldn't submit the job to the LAVA master")
 
         self._logger.info("Successfully submitted job -- id: %s", job_id)
 
@@ -255,14 +1363,146 @@ class LavaServer(object):
                               job_id, self._base_url, job_id)
             job_list.append(job_id)
 
-        if wait:
-            listener = JobListener(self._pub_url, logger=self._logger)
-            success = listener.wait(job_list, seconds=self._timeout)
+        return job_list
+
+    def wait(self, job_list, callback=None):
+        """Wait for the jobs in job_list to finish
 
-            return success and self.check_tests_results(job_list)
+        Returns True only if every job completed and all its tests passed.
+
+        keyword arguments:
+        callback -- passed to JobListener.wait (default None)
+        """
+        listener = self.listener()
+        with self.stream_results(job_list):
+            success = listener.wait(job_list, seconds=self._timeout,
+                                    callback=callback)
+        self.log_stats()
+
+        return success and self.check_tests_results(job_list)
+
+    def wait_test_sets(self, test_sets, fail_fast=None):
+        """Wait for several groups of jobs at the same time
+
+        The result of each group is reported as soon as all its jobs finish.
+
+        arguments:
+        test_sets -- OrderedDict with the list of job IDs of each group
+
+        keyword arguments:
+        fail_fast -- FailFast watching the jobs, told about the failed tests.
+                     The results are streamed to find them, every
+                     FAIL_FAST_STREAM_INTERVAL seconds if
+                     lava.server.results.stream_interval is not set
+                     (default None)
+
+        Returns an OrderedDict with the success of each group, a group is
+        successful if all its jobs completed and all their tests passed.
+        """
+        results = OrderedDict((name, False) for name in test_sets)
+        finished = defaultdict(dict)
+        pending = dict((job_id, name) for name, job_list in test_sets.items()
+                       for job_id in job_list)
+
+        def report(job_id, status):
+            name = pending[job_id]
+            finished[name][job_id] = status
+            job_list = test_sets[name]
+            if len(finished[name]) < len(job_list):
+                return
+
+            statuses = [finished[name][id] for id in job_list]
+            if any(s not in JobListener.FINISHED_JOB_STATUS for s in statuses):
+                self._logger.error("Test set %s did not finish in time", name)
+                return
+
+            if fail_fast and fail_fast.failed and 'Canceled' in statuses:
+                self._logger.error("Test set %s was canceled", name)
+                return
+
+            completed = all(s == 'Complete' for s in statuses)
+            results[name] = completed and self.check_tests_results(job_list)
+
+            if results[name]:
+                self._logger.info("Test set %s finished successfully", name)
+            else:
+                self._logger.error("Test set %s finished with errors", name)
+                if fail_fast:
+                    fail_fast.fail("Test set %s failed" % name)
+
+        def failed_case(job_id, case):
+            if case.get('result') == 'fail':
+                fail_fast.fail("Test %s/%s of job %s failed" % (
+                    case.get('suite'), case.get('name'), job_id))
+
+        # Every job expires at the deadline it was registered with
+        listener = self.listener()
+        stream = self.stream_results(
+            pending.keys(), callback=failed_case if fail_fast else None,
+            interval=self.FAIL_FAST_STREAM_INTERVAL if fail_fast else None)
+        with stream:
+            listener.wait(pending.keys(), callback=report)
+        self.log_stats()
+
+        return results
+
+    def submit(self, job_definition, wait=True, name=None, definition=None):
+        """Submit a job to the LAVA server"""
+        job_list = self.submit_job(job_definition, name=name,
+                                   definition=definition)
+
+        if wait:
+            return self.wait(job_list)
 
         return True
 
+    def stop_submissions(self):
+        """Make the submissions waiting in the window give up
+
+        Further submissions through the window raise SubmissionWindow.Closed.
+        """
+        if self._window:
+            self._window.close()
+
+    def cancel_jobs(self, job_list):
+        """Cancel several jobs with a few round trips
+
+        Returns the list of the jobs that were canceled.
+        """
+        batch = self.batch()
+        calls = [batch.call('scheduler.cancel_job', str(id)) for id in job_list]
+        batch.flush()
+
+        canceled = []
+        for id, call in zip(job_list, calls):
+            if call.fault():
+                self._logger.error("Couldn't cancel job %s - %s %s", id,
+                                   call.fault().faultCode,
+                                   call.fault().faultString)
+            else:
+                self._logger.info("Canceled job %s", id)
+                canceled.append(id)
+        return canceled
+
     def status(self, job_id):
         """Return the status of the corresponding job ID"""
         return self._rpc.scheduler.job_status(str(job_id))
+
+    def statuses(self, job_list):
+        """Return the status of several jobs with a few round trips
+
+        The result maps each job ID to its status as returned by status(),
+        or to None if the scheduler couldn't provide it.
+        """
+        batch = self.batch()
+        calls = [batch.call('scheduler.job_status', str(id)) for id in job_list]
+        batch.flush()
+
+        statuses = {}
+        for id, call in zip(job_list, calls):
+            if call.fault():
+                self._logger.error("Couldn't get the status of job %s - %s %s",
+                                   id, call.fault().faultCode,
+                                   call.fault().faultString)
+            statuses[id] = None if call.fault() else call.result()
+        return statuses
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2017 Siemens AG
+Author: Alfonso Ros Dos Santos
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+
+import heapq
+import logging
+from collections import defaultdict
+
+from lava_ctl import serialization
+from lava_ctl.lava.results import test_name
+
+
+def balance(tests, shards, durations=None):
+    """Split the tests in at most the given number of shards
+
+    The shards take about the same time to run according to the durations
+    of the tests, a dictionary by test name. The longest tests are placed
+    first, each one in the shard with the least work so far. Tests without
+    a known duration count as the mean of the others.
+
+    Every shard keeps the tests in their original order, and empty shards
+    are dropped.
+    """
+    durations = durations or {}
+    known = [durations[t.name] for t in tests if t.name in durations]
+    default = sum(known) / len(known) if known else 1.0
+    cost = [durations.get(t.name, default) for t in tests]
+
+    # sorted by decreasing duration, ties in the original order
+    order = sorted(range(len(tests)), key=lambda i: (-cost[i], i))
+    loads = [(0.0, shard) for shard in range(shards)]
+    assigned = [[] for _ in range(shards)]
+    for i in order:
+        load, shard = heapq.heappop(loads)
+        assigned[shard].append(i)
+        heapq.heappush(loads, (load + cost[i], shard))
+
+    return [[tests[i] for i in sorted(indexes)]
+            for indexes in assigned if indexes]
+
+
+class DurationHistory(object):
+    """Durations of the tests in the last runs of each test set
+
+    The durations come from the ResultsStore of the LavaServer, averaged
+    over the last RUNS jobs of the test set that ran each test.
+
+    Test sets without recorded results fall back to the last completed run
+    found in the JobJournal of the LavaServer, whose results are read with
+    results.get_testjob_results_yaml. Only runs in which all the jobs of the
+    test set completed are used. The results read are recorded in the
+    ResultsStore, so the master is asked only once for them.
+
+    """
+
+    # Maximum number of past jobs averaged for the duration of a test
+    RUNS = 5
+
+    def __init__(self, lava_server=None, logger=None):
+        """DurationHistory initializer
+
+        keyword arguments:
+        lava_server -- LavaServer with the journal and the results. Without
+                       it, no duration is ever known (default None)
+        logger -- the logger class (default None)
+        """
+        super(DurationHistory, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.DurationHistory')
+        self._lava_server = lava_server
+        self._jobs = None
+        self._durations = {}
+
+    def durations(self, name):
+        """Return the seconds each test of a test set took the last time"""
+        if name not in self._durations:
+            durations = self._recorded(name)
+            if not durations:
+                jobs = self._history().get(name)
+                durations = self._read(name, jobs) if jobs else {}
+            self._durations[name] = durations
+            self._logger.debug("Durations of %s: %s", name,
+                               self._durations[name])
+        return self._durations[name]
+
+    def _recorded(self, name):
+        """Return the durations of the tests in the ResultsStore"""
+        store = self._lava_server and self._lava_server.results
+        if not store:
+            return {}
+        return store.test_durations(name, runs=self.RUNS)
+
+    def _history(self):
+        """Return the jobs of the last completed run of every test set"""
+        if self._jobs is None:
+            self._jobs = {}
+            journal = self._lava_server and self._lava_server.journal
+            if not journal:
+                return self._jobs
+
+            statuses = journal.last_status()
+            for run, entries in journal.runs().items():
+                if run == journal.run_id:
+                    continue
+                jobs = defaultdict(list)
+                for entry in entries:
+                    jobs[entry.get('name')].extend(entry['jobs'])
+                for name, job_list in jobs.items():
+                    if name and all(statuses.get(str(id)) == 'Complete'
+                                    for id in job_list):
+                        self._jobs[name] = job_list
+        return self._jobs
+
+    def _read(self, name, job_list):
+        """Add up the durations of the test cases of every test"""
+        store = self._lava_server.results
+        batch = self._lava_server.batch()
+        calls = [batch.call('results.get_testjob_results_yaml', id)
+                 for id in job_list]
+        batch.flush()
+
+        durations = defaultdict(float)
+        for id, call in zip(job_list, calls):
+            if call.fault():
+                self._logger.warning("Couldn't get the results of job %s - "
+                                     "%s %s", id, call.fault().faultCode,
+                                     call.fault().faultString)
+                return {}
+
+            cases = serialization.load(call.result()) or []
+            if store:
+                # the results of the job are not read again
+                for _ in store.recording(id, [cases], name=name):
+                    pass
+
+            for case in cases:
+                if case.get('suite') == 'lava':
+                    continue
+                try:
+                    duration = float(case.get('duration') or 0)
+                except ValueError:
+                    continue
+                durations[test_name(case['suite'])] += duration
+        return dict(durations)
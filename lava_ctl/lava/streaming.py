@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2017 Siemens AG
+Author: Alfonso Ros Dos Santos
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+
+import logging
+import threading
+
+from lava_ctl import serialization
+
+
+class ResultStream(object):
+    """Reports the test cases of the running jobs as soon as they appear
+
+    A background thread polls the results of the jobs that are running
+    every few seconds. Only the test cases after the ones already seen are
+    requested (with an offset in each test suite), and all the jobs are
+    polled together in a couple of system.multicall round trips, so the
+    polling stays cheap even for many long jobs.
+
+    Use it as a context manager around the wait for the jobs, nothing is
+    streamed without an interval:
+
+      with ResultStream(server, job_list, interval=30):
+          server.listener().wait(job_list)
+
+    """
+
+    # Test suite with the results of the LAVA actions themselves
+    LAVA_SUITE = 'lava'
+
+    def __init__(self, lava_server, job_list, interval, callback=None,
+                 logger=None):
+        """ResultStream initializer
+
+        keyword arguments:
+        lava_server -- LavaServer of the jobs
+        job_list -- IDs of the jobs to follow
+        interval -- seconds between polls, None disables the stream
+        callback -- also called as callback(job_id, test_case) for every
+                    new test case (default None)
+        logger -- the logger class (default None)
+        """
+        super(ResultStream, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.ResultStream')
+        self._lava_server = lava_server
+        self._listener = lava_server.listener()
+        self._job_list = list(job_list)
+        self._interval = interval
+        self._callback = callback
+        self._offsets = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self._interval:
+            self._thread = threading.Thread(target=self._run,
+                                            name='ResultStream')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            running = [id for id in self._job_list
+                       if self._listener.register(id).status == 'Running']
+            if not running:
+                if all(self._listener.register(id).done()
+                       for id in self._job_list):
+                    return
+                continue
+
+            try:
+                self.poll(running)
+            except Exception:
+                self._logger.exception("Error while streaming the results")
+
+    def poll(self, job_list):
+        """Report the new test cases of the jobs in job_list"""
+        page_size = self._lava_server.RESULTS_PAGE_SIZE
+
+        batch = self._lava_server.batch()
+        calls = [(id, batch.call('results.get_testjob_suites_list_yaml', id))
+                 for id in job_list]
+        batch.flush()
+
+        if all(call.fault() for _, call in calls):
+            self._logger.warning("The results can't be streamed - %s",
+                                 calls[0][1].fault().faultString)
+            self._stop.set()
+            return
+
+        pending = []
+        for id, call in calls:
+            if call.fault():
+                continue
+            for suite in serialization.load(call.result()) or []:
+                if suite['name'] != self.LAVA_SUITE:
+                    pending.append((id, suite['name']))
+
+        # Keep reading the suites that returned a full page
+        while pending:
+            batch = self._lava_server.batch()
+            calls = [(key, batch.call('results.get_testsuite_results_yaml',
+                                      key[0], key[1], page_size,
+                                      self._offsets.get(key, 0)))
+                     for key in pending]
+            batch.flush()
+
+            pending = []
+            for key, call in calls:
+                if call.fault():
+                    self._logger.debug("Results of %s not available - %s",
+                                       key, call.fault().faultString)
+                    continue
+                page = serialization.load(call.result()) or []
+                self._offsets[key] = self._offsets.get(key, 0) + len(page)
+                for case in page:
+                    self._log(key[0], case)
+                    if self._callback:
+                        self._callback(key[0], case)
+                if len(page) == page_size:
+                    pending.append(key)
+
+    def _log(self, job_id, case):
+        log = self._logger.info if case.get('result') != 'fail' \
+            else self._logger.error
+        log("Job %s -- %s/%s: %s", job_id, case.get('suite'), case.get('name'),
+            case.get('result'))
@@ -1,2 +1,5 @@
 from model import Test
 from repo import TestSetsRepo
+from mirror import MirrorCache
+from cache import TestSetCache
+from matrix import TestMatrix
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Siemens AG
+# Author: Alfonso Ros Dos Santos
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import os
+import time
+import errno
+import hashlib
+import logging
+import tempfile
+
+from lava_ctl import serialization
+from lava_ctl.utils import lavactl_dir
+
+
+class TestSetCache(object):
+    """Parsed test sets of the test repositories
+
+    The content of a file at a commit never changes, so the tests read from
+    a test set file are stored once its commit is known, keyed by the
+    repository URL, the commit SHA and the path of the file. Each entry is
+    a YAML file in ~/.lava-ctl/cache/testsets with the list of test
+    configurations, so that they are loaded back exactly as parsed from the
+    test set. Entries not used for MAX_AGE seconds are removed.
+
+    """
+
+    # 30 days
+    MAX_AGE = 30 * 24 * 60 * 60
+
+    def __init__(self, path=None, logger=None):
+        """TestSetCache initializer
+
+        keyword arguments:
+        path -- cache directory (default ~/.lava-ctl/cache/testsets)
+        logger -- the logger class (default None)
+        """
+        super(TestSetCache, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.TestSetCache')
+        self._path = path or lavactl_dir('cache', 'testsets', '')
+
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path)
+        self.prune()
+
+    @property
+    def path(self):
+        return self._path
+
+    def has(self, url, sha, filename):
+        """Return True if the test set is in the cache
+
+        The entry may still be removed before it is read, get() tells.
+        """
+        return os.path.exists(self._entry(url, sha, filename))
+
+    def get(self, url, sha, filename):
+        """Return the test configurations of a test set, None if missing"""
+        entry = self._entry(url, sha, filename)
+        try:
+            with open(entry, 'r') as f:
+                tests = serialization.load(f)
+        except (IOError, OSError, serialization.YAMLError):
+            return None
+
+        try:
+            os.utime(entry, None)
+        except OSError:
+            # Removed by a concurrent lava-ctl process
+            pass
+        return tests
+
+    def put(self, url, sha, filename, tests):
+        """Store the test configurations of a test set"""
+        try:
+            data = serialization.dump(tests)
+        except serialization.YAMLError, exc:
+            self._logger.debug('Not caching %s - %s', filename, exc)
+            return
+
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self._path)
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.rename(tmp, self._entry(url, sha, filename))
+        except (IOError, OSError), exc:
+            self._logger.debug('Could not write the test set cache - %s', exc)
+
+    def prune(self):
+        """Remove the entries not used for MAX_AGE seconds"""
+        now = time.time()
+        for name in os.listdir(self._path):
+            entry = os.path.join(self._path, name)
+            try:
+                if now - os.path.getmtime(entry) >= self.MAX_AGE:
+                    os.remove(entry)
+            except OSError, exc:
+                # Removed by a concurrent lava-ctl process
+                if exc.errno != errno.ENOENT:
+                    self._logger.debug('Could not remove %s - %s', entry, exc)
+
+    def _entry(self, url, sha, filename):
+        key = u'%s\0%s\0%s' % (url, sha, filename)
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.yaml'
+        return os.path.join(self._path, name)
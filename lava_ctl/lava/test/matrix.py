@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Siemens AG
+# Author: Alfonso Ros Dos Santos
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import logging
+
+from collections import namedtuple
+from itertools import product
+
+
+class Cell(namedtuple('Cell', ['device', 'image_name', 'image', 'params'])):
+    """Combination of device, image and test parameters of a TestMatrix"""
+
+    __slots__ = ()
+
+    @property
+    def label(self):
+        """Short description of the cell, e.g. 'qemux86,img1,A=1'"""
+        params = ['%s=%s' % (k, v) for k, v in sorted(self.params.items())]
+        return ','.join([self.device, self.image_name] + params)
+
+
+class TestMatrix(object):
+    """Combinations of devices, images and parameters to run test sets on
+
+    The matrix comes from the 'matrix' section of a test description:
+
+      matrix:
+        devices: [qemux86, iot2000]
+        images:
+          - name: x86
+            kernel: https://...
+            rootfs: https://...
+          - name: wic
+            url: https://...
+        params:
+          ITERATIONS: [1, 10]
+        exclude:
+          - device: iot2000
+            image: x86
+        include:
+          - device: qemux86
+            image: x86
+            params: {ITERATIONS: 100}
+
+    The cells are the product of the devices, the images and the values of
+    every parameter, without the cells matching an 'exclude' rule, followed
+    by the cells in 'include'. A rule matches a cell when all the keys it
+    gives match: 'device', 'image' (by name) and each of the 'params'.
+    The images are named after their position when they have no name.
+
+    Without 'devices' or 'images', those of the test description are used,
+    so a description without matrix has a single cell.
+
+    """
+
+    def __init__(self, devices, images, params=None, include=None,
+                 exclude=None, logger=None):
+        """TestMatrix initializer
+
+        keyword arguments:
+        devices -- list of device types
+        images -- list of image configurations
+        params -- parameter name to list of values (default None)
+        include -- list of additional cells (default None)
+        exclude -- list of rules of the cells to leave out (default None)
+        logger -- the logger class (default None)
+        """
+        super(TestMatrix, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.TestMatrix')
+        self._devices = list(devices)
+        self._images = []
+        for index, image in enumerate(images):
+            image = dict(image)
+            self._images.append((str(image.pop('name', index)), image))
+        self._params = params or {}
+        self._include = include or []
+        self._exclude = exclude or []
+
+    @classmethod
+    def from_config(cls, test_config, logger=None):
+        """Return the TestMatrix of a test description Config"""
+        matrix = test_config.get('matrix') if test_config.has('matrix') else {}
+
+        devices = matrix.get('devices')
+        if not devices:
+            devices = [test_config.get('device')]
+
+        images = matrix.get('images')
+        if not images:
+            images = [test_config.get('image')]
+
+        return cls(devices, images, params=matrix.get('params'),
+                   include=matrix.get('include'),
+                   exclude=matrix.get('exclude'), logger=logger)
+
+    def is_single(self):
+        """Return True if the matrix has only one cell"""
+        sweeps = [values for values in self._params.values() if len(values) > 1]
+        return (len(self._devices) == 1 and len(self._images) == 1 and
+                not sweeps and not self._include and not self._exclude)
+
+    def cells(self):
+        """Generate the cells of the matrix"""
+        names = sorted(self._params)
+        sweeps = [self._params[name] for name in names]
+
+        for device, (image_name, image), values in product(
+                self._devices, self._images, product(*sweeps)):
+            cell = Cell(device, image_name, image, dict(zip(names, values)))
+            if any(self._matches(rule, cell) for rule in self._exclude):
+                continue
+            yield cell
+
+        for spec in self._include:
+            yield self._cell(spec)
+
+    def _cell(self, spec):
+        device = spec.get('device', self._devices[0])
+        image_name = str(spec.get('image', self._images[0][0]))
+        images = dict(self._images)
+        if image_name not in images:
+            raise RuntimeError('Unknown image in the matrix', image_name)
+        return Cell(device, image_name, images[image_name],
+                    dict(spec.get('params') or {}))
+
+    def _matches(self, rule, cell):
+        if 'device' in rule and rule['device'] != cell.device:
+            return False
+        if 'image' in rule and str(rule['image']) != cell.image_name:
+            return False
+        for name, value in (rule.get('params') or {}).iteritems():
+            if cell.params.get(name) != value:
+                return False
+        return True
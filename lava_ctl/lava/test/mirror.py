@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Siemens AG
+# Author: Alfonso Ros Dos Santos
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import os
+import errno
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+from contextlib import contextmanager
+
+import git
+
+from lava_ctl.utils import lavactl_dir
+
+
+class MirrorCache(object):
+    """Bare mirrors of the test repositories shared between runs
+
+    Every repository is cloned once with 'git clone --mirror' into
+    ~/.lava-ctl/cache/git and then only updated with 'git fetch'. Where the
+    server supports it, the mirror is a partial clone without file contents
+    (--filter=blob:none): the files are read straight from the object store
+    at the requested revision and only their contents are downloaded,
+    nothing is checked out.
+
+    The mirrors are shared by all the lava-ctl processes of the user. For
+    every mirror there are two lock files next to it:
+
+      KEY.lock -- held exclusively while the mirror is modified
+      KEY.use -- held shared while the mirror is read
+
+    When the mirrors take more than max_size MiB, the least recently used
+    ones that are not in use are removed.
+
+    """
+
+    # MiB
+    DEFAULT_MAX_SIZE = 2048
+
+    def __init__(self, config=None, logger=None):
+        """MirrorCache initializer
+
+        keyword arguments:
+        config -- lava-ctl configuration (default None)
+        logger -- the logger class (default None)
+        """
+        super(MirrorCache, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.MirrorCache')
+        self._fetched = set()
+        self._fetched_lock = threading.Lock()
+        self.read_config(config)
+
+    def read_config(self, config):
+        """Read the relevant configuration parameters
+
+          - git.cache.path
+          - git.cache.max_size
+
+        """
+        self._path = None
+        self._max_size = self.DEFAULT_MAX_SIZE
+        if config is not None:
+            if config.has('git.cache.path'):
+                self._path = config.get('git.cache.path')
+            if config.has('git.cache.max_size'):
+                self._max_size = int(config.get('git.cache.max_size'))
+
+        self._path = self._path or lavactl_dir('cache', 'git', '')
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path)
+
+    @property
+    def path(self):
+        return self._path
+
+    def mirror(self, url):
+        """Return the up to date mirror of the repository at url
+
+        The mirror is fetched only the first time, later calls on the same
+        MirrorCache return it as it is. This method is thread-safe.
+        """
+        url = self._url(url)
+        path = self._mirror_path(url)
+        with self._lock(url, 'lock', fcntl.LOCK_EX):
+            if not os.path.isdir(path):
+                self._logger.debug('mirroring %s into %s', url, path)
+                repo = self._clone(url, path)
+            else:
+                repo = git.Repo(path)
+                with self._fetched_lock:
+                    fetched = url in self._fetched
+                if not fetched:
+                    self._logger.debug('fetching %s into %s', url, path)
+                    repo.git.fetch('--prune', 'origin')
+
+        with self._fetched_lock:
+            self._fetched.add(url)
+        return repo
+
+    @contextmanager
+    def commit(self, url, revision=None):
+        """Give a revision of the repository at url
+
+        The context manager gives the git.Commit of the revision, from the
+        up to date mirror of the repository. The mirror is not evicted while
+        the context is active. Read its files with MirrorCache.read().
+
+        keyword arguments:
+        url -- URL of the git repository
+        revision -- branch, tag or commit (default HEAD)
+        """
+        url = self._url(url)
+        revision = revision or 'HEAD'
+
+        with self._lock(url, 'use', fcntl.LOCK_SH):
+            self._touch(url)
+            repo = self.mirror(url)
+            try:
+                sha = repo.git.rev_parse('--verify', revision + '^{commit}')
+                self._logger.debug('reading %s (%s) of %s', revision, sha, url)
+                yield repo.commit(sha)
+            finally:
+                # stop the cat-file processes reading the objects
+                repo.git.clear_cache()
+
+        self.evict()
+
+    @staticmethod
+    def read(commit, path):
+        """Return the content of the file at path in a git.Commit
+
+        In a partial mirror the content is only downloaded at this point.
+        Raises IOError if there is no such file.
+        """
+        try:
+            blob = commit.tree / path
+        except KeyError:
+            raise IOError(errno.ENOENT, 'No such file in %s' % commit.hexsha,
+                          path)
+        return blob.data_stream.read()
+
+    def evict(self):
+        """Remove the least recently used mirrors above max_size
+
+        The most recently used mirror is always kept, even if it is bigger
+        than max_size on its own.
+        """
+        mirrors = []
+        for name in os.listdir(self._path):
+            if name.endswith('.git'):
+                key = name[:-len('.git')]
+                path = os.path.join(self._path, name)
+                mirrors.append((self._last_use(key), key, self._size(path)))
+
+        total = sum(size for _, _, size in mirrors)
+        for _, key, size in sorted(mirrors)[:-1]:
+            if total <= self._max_size * 1024 * 1024:
+                break
+            if self._remove(key):
+                total -= size
+
+    def _remove(self, key):
+        """Remove a mirror unless it is in use, return True if removed"""
+        use = open(os.path.join(self._path, key + '.use'), 'a')
+        try:
+            try:
+                fcntl.flock(use, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                return False
+
+            with open(os.path.join(self._path, key + '.lock'), 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._logger.debug('evicting mirror %s', key)
+                shutil.rmtree(os.path.join(self._path, key + '.git'),
+                              ignore_errors=True)
+            return True
+        finally:
+            use.close()
+
+    def _clone(self, url, path):
+        # clone next to the final location, so that an interrupted clone
+        # never leaves a broken mirror behind
+        tmp = tempfile.mkdtemp(dir=self._path, prefix='clone-')
+        try:
+            try:
+                # blobless: the file contents are downloaded when read
+                git.Repo.clone_from(url, tmp, mirror=True, filter='blob:none')
+            except git.GitCommandError, exc:
+                # git older than 2.19 doesn't know about partial clones
+                if 'filter' not in str(exc):
+                    raise
+                shutil.rmtree(tmp, ignore_errors=True)
+                git.Repo.clone_from(url, tmp, mirror=True)
+            os.rename(tmp, path)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        return git.Repo(path)
+
+    def _url(self, url):
+        # repositories in the local file system are cloned by absolute path
+        return os.path.abspath(url) if os.path.isdir(url) else url
+
+    def _key(self, url):
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        return hashlib.sha1(url).hexdigest()
+
+    def _mirror_path(self, url):
+        return os.path.join(self._path, self._key(url) + '.git')
+
+    @contextmanager
+    def _lock(self, url, kind, operation):
+        with open(os.path.join(self._path, '%s.%s' % (self._key(url), kind)),
+                  'a') as lock:
+            fcntl.flock(lock, operation)
+            yield
+
+    def _touch(self, url):
+        os.utime(os.path.join(self._path, self._key(url) + '.use'), None)
+
+    def _last_use(self, key):
+        try:
+            return os.path.getmtime(os.path.join(self._path, key + '.use'))
+        except OSError:
+            return 0
+
+    def _size(self, path):
+        size = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return size
@@ -23,6 +23,9 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
+import copy
+
+
 class Test(object):
     """
 
@@ -99,3 +102,13 @@ class Test(object):
     @property
     def steps(self):
         return self._steps
+
+    def with_params(self, params):
+        """Return a copy of the test with additional parameters
+
+        The given parameters take precedence over those of the test.
+        """
+        test = copy.copy(self)
+        test._params = dict(self._params)
+        test._params.update(params)
+        return test
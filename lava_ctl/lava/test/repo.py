@@ -23,44 +23,110 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
-import os
-import git
-import yaml
-import shutil
+import re
 import logging
 
+from lava_ctl import serialization
 from lava_ctl.lava.test import Test
+from lava_ctl.lava.test.cache import TestSetCache
+from lava_ctl.lava.test.mirror import MirrorCache
 
 
 class TestSetsRepo(object):
-    """Git Repository containing different tests"""
+    """Git Repository containing different tests
 
-    DIRECTORY = os.path.join(os.curdir, 'test_repo')
+    Used as a context manager, it gives a generator of the test sets listed
+    in 'tests', in the same order. Each test set is read from the git
+    objects of the requested revision only when the generator reaches it.
 
-    def __init__(self, config, logger=None):
+    The parsed test sets are kept in a TestSetCache. When the revision is a
+    full commit SHA and all the test sets are in the cache, the repository
+    is not even fetched.
+
+    """
+
+    SHA_REGEX = re.compile(r'^[0-9a-f]{40}$')
+
+    def __init__(self, config, cache=None, set_cache=None, logger=None):
+        """TestSetsRepo initializer
+
+        keyword arguments:
+        config -- test repository entry of the test description
+        cache -- MirrorCache to read the repository from (default None)
+        set_cache -- TestSetCache of the parsed test sets (default None)
+        logger -- the logger class (default None)
+        """
         super(TestSetsRepo, self).__init__()
         self._logger = logger or logging.getLogger(__name__)
         self._config = config.copy()
+        self._cache = cache or MirrorCache(logger=self._logger)
+        self._set_cache = set_cache or TestSetCache(logger=self._logger)
+        self._commit = None
+
+    @property
+    def url(self):
+        return self._config['url']
+
+    @property
+    def revision(self):
+        return self._config.get('revision') or self._config.get('branch')
+
+    def cached(self):
+        """Return True if the test sets can be read without the repository"""
+        sha = self.revision
+        return (sha is not None and self.SHA_REGEX.match(sha) is not None and
+                all(self._set_cache.has(self.url, sha, filename)
+                    for filename in self._config['tests']))
 
     def __enter__(self):
-        self._logger.debug('cloning %s to %s', self._config['url'], self.DIRECTORY)
-        if 'branch' in self._config:
-            self._repo = git.Repo.clone_from(
-                self._config['url'], self.DIRECTORY, branch=self._config['branch'])
-        else:
-            self._repo = git.Repo.clone_from(self._config['url'], self.DIRECTORY)
+        if self.cached():
+            self._logger.debug('test sets of %s at %s cached',
+                               self.url, self.revision)
+            return self.test_sets(self.revision)
 
-        if 'revision' in self._config:
-            self._repo.head.reset(commit=self._config['revision'])
+        commit = self._open(self.revision)
+        return self.test_sets(commit.hexsha, commit)
 
-        test_sets = []
+    def __exit__(self, type, value, traceback):
+        if self._commit is not None:
+            self._commit.__exit__(type, value, traceback)
+            self._commit = None
+
+    def prepare(self):
+        """Fetch the repository and parse its test sets into the cache
+
+        Reading the test sets afterwards doesn't fetch or parse them again.
+        Several repositories can be prepared at the same time.
+        """
+        if self.cached():
+            return
+        with self as test_sets:
+            for _ in test_sets:
+                pass
+
+    def test_sets(self, sha, commit=None):
+        """Generate the test sets at a commit
+
+        keyword arguments:
+        sha -- SHA of the commit
+        commit -- git.Commit to read the test sets missing in the cache
+                  from (default None)
+        """
         for filename in self._config['tests']:
-            filename = os.path.join(self.DIRECTORY, filename)
-            with open(filename, 'r') as testfile:
-                test = yaml.load(testfile.read())
-                test_sets.append([Test(config=conf, logger=self._logger) for conf in test['tests']])
-        return test_sets
+            confs = self._set_cache.get(self.url, sha, filename)
+            if confs is not None:
+                yield [Test(config=conf, logger=self._logger) for conf in confs]
+                continue
 
-    def __exit__(self, type, value, traceback):
-        self._logger.debug('removing %s', self._config['url'], self.DIRECTORY)
-        shutil.rmtree(self.DIRECTORY)
+            if commit is None:
+                # removed from the cache after cached() was checked
+                commit = self._open(sha)
+            test = serialization.load(MirrorCache.read(commit, filename))
+            tests = [Test(config=conf, logger=self._logger) for conf in test['tests']]
+            self._set_cache.put(self.url, sha, filename, test['tests'])
+            yield tests
+
+    def _open(self, revision):
+        # the commit is released by __exit__
+        self._commit = self._cache.commit(self.url, revision)
+        return self._commit.__enter__()
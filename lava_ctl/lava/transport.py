@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2017 Siemens AG
+Author: Alfonso Ros Dos Santos
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import re
+import time
+import Queue
+import errno
+import socket
+import httplib
+import logging
+import threading
+import xmlrpclib
+
+
+class PooledTransport(xmlrpclib.Transport):
+    """Keep-alive XML-RPC transport with a pool of HTTP connections
+
+    The standard transport opens a new connection whenever the previous one
+    can't be reused and is not safe to share between threads. This transport
+    keeps the idle connections in a pool, so every thread takes its own
+    connection for the duration of a call and gives it back afterwards.
+
+    Responses are always requested gzip encoded. Requests bigger than
+    gzip_threshold bytes are gzip encoded too, which requires a server that
+    accepts compressed requests.
+
+    The time spent in every RPC method is accumulated and can be retrieved
+    with PooledTransport.stats().
+
+    """
+
+    METHOD_NAME_REGEX = re.compile(r'<methodName>([^<]+)</methodName>')
+
+    def __init__(self, connections=4, gzip_threshold=None, use_datetime=0,
+                 logger=None):
+        """PooledTransport initializer
+
+        keyword arguments:
+        connections -- maximum number of idle connections kept (default 4)
+        gzip_threshold -- minimum size in bytes of the requests that are gzip
+                          encoded (default None, requests are not encoded)
+        logger -- the logger class (default None)
+        """
+        xmlrpclib.Transport.__init__(self, use_datetime)
+        self._logger = logger or logging.getLogger(__name__ + '.PooledTransport')
+        self.encode_threshold = gzip_threshold
+        self._connections = connections
+        self._pool = Queue.LifoQueue()
+        self._host_info = {}
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def stats(self):
+        """Return the timing of the calls by method name
+
+        For each method there is a dictionary with the number of 'calls',
+        the 'total' and 'max' time in seconds, and the 'errors'.
+        """
+        with self._stats_lock:
+            return dict((method, dict(stats))
+                        for method, stats in self._stats.items())
+
+    def request(self, host, handler, request_body, verbose=0):
+        match = self.METHOD_NAME_REGEX.search(request_body, 0, 256)
+        method = match.group(1) if match else 'unknown'
+
+        start = time.time()
+        failed = True
+        try:
+            result = self._request(host, handler, request_body, verbose)
+            failed = False
+            return result
+        finally:
+            self._record(method, time.time() - start, failed)
+
+    def _request(self, host, handler, request_body, verbose):
+        # retry once if the pooled connection has gone cold
+        for i in (0, 1):
+            try:
+                return self.single_request(host, handler, request_body, verbose)
+            except socket.error, e:
+                if i or e.errno not in (errno.ECONNRESET, errno.ECONNABORTED,
+                                        errno.EPIPE):
+                    raise
+            except httplib.BadStatusLine:
+                if i:
+                    raise
+
+    def single_request(self, host, handler, request_body, verbose=0):
+        connection = self._acquire(host)
+        if verbose:
+            connection.set_debuglevel(1)
+
+        try:
+            self.send_request(connection, handler, request_body)
+            self.send_host(connection, host)
+            self.send_user_agent(connection)
+            self.send_content(connection, request_body)
+
+            response = connection.getresponse(buffering=True)
+            if response.status == 200:
+                self.verbose = verbose
+                result = self.parse_response(response)
+                self._release(host, connection)
+                return result
+        except xmlrpclib.Fault:
+            self._release(host, connection)
+            raise
+        except Exception:
+            # All unexpected errors leave the connection in a strange state
+            connection.close()
+            raise
+
+        # discard any response data and raise exception
+        if response.getheader("content-length", 0):
+            response.read()
+        self._release(host, connection)
+        raise xmlrpclib.ProtocolError(host + handler, response.status,
+                                      response.reason, response.msg)
+
+    def send_host(self, connection, host):
+        extra_headers = self._get_host_info(host)[1]
+        if extra_headers:
+            if isinstance(extra_headers, dict):
+                extra_headers = extra_headers.items()
+            for key, value in extra_headers:
+                connection.putheader(key, value)
+
+    def close(self):
+        """Close all the idle connections"""
+        while True:
+            try:
+                self._pool.get_nowait()[1].close()
+            except Queue.Empty:
+                return
+
+    def _get_host_info(self, host):
+        if host not in self._host_info:
+            self._host_info[host] = self.get_host_info(host)
+        return self._host_info[host]
+
+    def _acquire(self, host):
+        """Take an idle connection to host from the pool or open a new one"""
+        while True:
+            try:
+                pooled_host, connection = self._pool.get_nowait()
+            except Queue.Empty:
+                break
+            if pooled_host == host:
+                return connection
+            connection.close()
+
+        self._logger.debug("New connection to %s", self._get_host_info(host)[0])
+        return httplib.HTTPConnection(self._get_host_info(host)[0])
+
+    def _release(self, host, connection):
+        """Return a connection to the pool"""
+        if self._pool.qsize() < self._connections:
+            self._pool.put((host, connection))
+        else:
+            connection.close()
+
+    def _record(self, method, elapsed, failed):
+        with self._stats_lock:
+            stats = self._stats.setdefault(
+                method, {'calls': 0, 'total': 0.0, 'max': 0.0, 'errors': 0})
+            stats['calls'] += 1
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            stats['errors'] += int(failed)
+
+
+class RpcCall(object):
+    """Result of a call queued in an RpcBatch"""
+
+    def __init__(self, method, params):
+        super(RpcCall, self).__init__()
+        self.method = method
+        self.params = params
+        self._result = None
+        self._fault = None
+        self._done = False
+
+    def done(self):
+        """Return True once the batch with the call has been flushed"""
+        return self._done
+
+    def result(self):
+        """Return the result of the call, raise its xmlrpclib.Fault if any"""
+        if not self._done:
+            raise RuntimeError('RPC call not flushed yet', self.method)
+        if self._fault is not None:
+            raise self._fault
+        return self._result
+
+    def fault(self):
+        """Return the xmlrpclib.Fault of the call or None if it succeeded"""
+        return self._fault
+
+    def _set(self, result=None, fault=None):
+        self._result = result
+        self._fault = fault
+        self._done = True
+
+
+class RpcBatch(object):
+    """Queue of XML-RPC calls sent together through system.multicall
+
+    Calls are queued with call() and sent with flush(), which splits them in
+    round trips of at most max_calls calls. The result or the fault of every
+    call is available from the RpcCall returned by call(). Servers without
+    system.multicall get the calls one by one.
+
+    Example:
+
+      batch = RpcBatch(proxy)
+      calls = [batch.call('scheduler.job_status', id) for id in job_ids]
+      batch.flush()
+      statuses = [c.result() for c in calls]
+
+    """
+
+    def __init__(self, proxy, max_calls=100, logger=None):
+        super(RpcBatch, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.RpcBatch')
+        self._proxy = proxy
+        self._max_calls = max_calls
+        self._calls = []
+
+    def call(self, method, *params):
+        """Queue a call and return its RpcCall"""
+        call = RpcCall(method, params)
+        self._calls.append(call)
+        return call
+
+    def __len__(self):
+        return len(self._calls)
+
+    def flush(self):
+        """Send all the queued calls and return their RpcCall objects"""
+        calls, self._calls = self._calls, []
+        for start in range(0, len(calls), self._max_calls):
+            self._send(calls[start:start + self._max_calls])
+        return calls
+
+    def _send(self, calls):
+        if len(calls) == 1:
+            return self._send_one(calls[0])
+
+        try:
+            results = self._proxy.system.multicall(
+                [{'methodName': c.method, 'params': c.params} for c in calls])
+        except xmlrpclib.Fault, flt:
+            self._logger.debug("system.multicall not available - %s %s",
+                               flt.faultCode, flt.faultString)
+            for call in calls:
+                self._send_one(call)
+            return
+
+        for call, result in zip(calls, results):
+            if isinstance(result, dict):
+                call._set(fault=xmlrpclib.Fault(result.get('faultCode'),
+                                                result.get('faultString')))
+            else:
+                call._set(result=result[0])
+
+    def _send_one(self, call):
+        try:
+            call._set(result=getattr(self._proxy, call.method)(*call.params))
+        except xmlrpclib.Fault, flt:
+            call._set(fault=flt)
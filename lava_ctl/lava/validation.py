@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2017 Siemens AG
+Author: Alfonso Ros Dos Santos
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import os
+import time
+import errno
+import hashlib
+import logging
+
+from cerberus import Validator
+
+from lava_ctl.config.schemas import JOB_SCHEMA
+from lava_ctl.utils import lavactl_dir
+
+
+class JobValidator(object):
+    """Offline validation of LAVA job definitions
+
+    The definitions are checked against the JOB_SCHEMA bundled with lava-ctl,
+    which finds the usual mistakes (missing keys, wrong types, malformed
+    image URLs...) without contacting the LAVA master. A definition that
+    passes this validation still has to be validated by the master.
+
+    """
+
+    def __init__(self, logger=None):
+        """JobValidator initializer
+
+        keyword arguments:
+        logger -- the logger class (default None)
+        """
+        super(JobValidator, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.JobValidator')
+        self._validator = Validator(JOB_SCHEMA, allow_unknown=True)
+        self._errors = {}
+
+    @property
+    def errors(self):
+        """Errors found by the last validation"""
+        return self._errors
+
+    def validate(self, job_definition):
+        """Return True if the job definition dict matches the schema"""
+        if not isinstance(job_definition, dict):
+            self._errors = {'definition': ['must be of dict type']}
+            return False
+
+        valid = self._validator.validate(job_definition)
+        self._errors = dict(self._validator.errors)
+
+        protocols = job_definition.get('protocols')
+        multinode = isinstance(protocols, dict) and 'lava-multinode' in protocols
+        if 'device_type' not in job_definition and not multinode:
+            self._errors['device_type'] = ['required field']
+            valid = False
+
+        if not valid:
+            self._logger.debug('Job definition errors %s', self._errors)
+        return valid
+
+
+class ValidationCache(object):
+    """Local record of the job definitions validated by a LAVA master
+
+    A definition that the master validated once is valid again as long as
+    neither the definition nor the master change. Each valid definition is
+    remembered by an empty file in ~/.lava-ctl/cache/validation, named
+    after a hash of the serialized definition, the master URL and the
+    master version. The modification time of the file is the time of the
+    validation and the entry expires after ttl seconds.
+
+    Only valid definitions are remembered, an invalid definition is always
+    validated again to report the errors of the master.
+
+    """
+
+    # One day
+    DEFAULT_TTL = 24 * 60 * 60
+
+    def __init__(self, url, version, ttl=None, path=None, logger=None):
+        """ValidationCache initializer
+
+        keyword arguments:
+        url -- URL of the LAVA master, without credentials
+        version -- version of the LAVA master
+        ttl -- seconds an entry stays valid (default one day)
+        path -- cache directory (default ~/.lava-ctl/cache/validation)
+        logger -- the logger class (default None)
+        """
+        super(ValidationCache, self).__init__()
+        self._logger = logger or logging.getLogger(__name__ + '.ValidationCache')
+        self._ttl = self.DEFAULT_TTL if ttl is None else ttl
+        self._path = path or lavactl_dir('cache', 'validation', '')
+        self._prefix = u'%s\0%s\0' % (url, version)
+        self._prefix = self._prefix.encode('utf-8')
+
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path)
+        self.prune()
+
+    @property
+    def path(self):
+        return self._path
+
+    def key(self, job_definition):
+        """Return the cache key of a serialized job definition"""
+        text = job_definition
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        return hashlib.sha1(self._prefix + text).hexdigest()
+
+    def valid(self, job_definition):
+        """Return True if the definition was validated less than ttl ago"""
+        try:
+            age = time.time() - os.path.getmtime(self._entry(job_definition))
+        except OSError:
+            return False
+        return 0 <= age < self._ttl
+
+    def add(self, job_definition):
+        """Remember that the master validated the definition"""
+        entry = self._entry(job_definition)
+        try:
+            with open(entry, 'a'):
+                pass
+            os.utime(entry, None)
+        except (IOError, OSError), exc:
+            self._logger.debug('Could not write the validation cache %s - %s',
+                               entry, exc)
+
+    def prune(self):
+        """Remove the expired entries"""
+        now = time.time()
+        for name in os.listdir(self._path):
+            entry = os.path.join(self._path, name)
+            try:
+                if now - os.path.getmtime(entry) >= self._ttl:
+                    os.remove(entry)
+            except OSError, exc:
+                # Removed by a concurrent lava-ctl process
+                if exc.errno != errno.ENOENT:
+                    self._logger.debug('Could not remove %s - %s', entry, exc)
+
+    def _entry(self, job_definition):
+        return os.path.join(self._path, self.key(job_definition))
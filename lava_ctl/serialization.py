@@ -0,0 +1,59 @@
+#
+# Copyright (c) 2017 Siemens AG
+# Author: Alfonso Ros Dos Santos
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""YAML serialization used across lava-ctl
+
+libyaml's CSafeLoader and CSafeDumper are used when PyYAML was built with
+them, otherwise the pure Python SafeLoader and SafeDumper. Both produce the
+same documents, the C versions are just several times faster for the big
+job definitions and test results handled by lava-ctl.
+"""
+
+import yaml
+
+from collections import defaultdict
+
+try:
+    from yaml import CSafeLoader as Loader, CSafeDumper as Dumper
+except ImportError:
+    from yaml import SafeLoader as Loader, SafeDumper as Dumper
+
+YAMLError = yaml.YAMLError
+
+# Configurations are stored in defaultdicts
+Dumper.add_representer(defaultdict, yaml.representer.SafeRepresenter.represent_dict)
+
+
+def load(stream):
+    """Parse the first YAML document in a string or file"""
+    return yaml.load(stream, Loader=Loader)
+
+
+def dump(data, stream=None, **kwargs):
+    """Serialize data as a YAML document
+
+    The document is written to stream if given, otherwise it is returned as
+    a string. The keyword arguments are the same as for yaml.dump.
+    """
+    return yaml.dump(data, stream, Dumper=Dumper, **kwargs)
@@ -22,28 +22,29 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
-import signal
-import logging
-from functools import wraps
+import os
+
 
 class TimeoutError(Exception):
     pass
 
-def timeout(seconds=10, logger=None):
-    """Handle the timeout of a submitted job"""
-    logger = logger or logging.getLogger(__name__ + '.timeout')
-    def decorator(func):
-        @wraps(func)
-        def set_timeout_alarm(*args, **kwargs):
 
-            def raise_timeout(*args, **kwargs):
-                logger.warning("Timeout exception")
-                raise TimeoutError()
+def lavactl_dir(*paths):
+    """Return a path inside the lava-ctl directory
 
-            signal.signal(signal.SIGALRM, raise_timeout)
-            signal.alarm(seconds)
-            result = func(*args, **kwargs)
-            signal.alarm(0)
-            return result
-        return set_timeout_alarm
-    return decorator
+    The directory is ~/.lava-ctl unless the LAVACTL_HOME environment
+    variable says otherwise. It holds the state that lava-ctl keeps between
+    runs, like the job journal. The parent directory of the returned path is
+    created if needed.
+    """
+    home = os.environ.get('LAVACTL_HOME',
+                          os.path.join(os.path.expanduser('~'), '.lava-ctl'))
+    path = os.path.join(home, *paths)
+    directory = os.path.dirname(path) if paths else path
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+    return path
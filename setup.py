@@ -39,7 +39,7 @@ setup(
     description='LAVA CI setup tool',
 
     license="MIT",
-    packages=find_packages(),
+    packages=find_packages(exclude=['tests']),
     include_package_data=True,
     data_files=[('', ['lava_ctl/VERSION'])],
     install_requires=[
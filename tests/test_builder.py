@@ -0,0 +1,71 @@
+import unittest
+from collections import defaultdict
+from itertools import product
+
+from lava_ctl.lava.builder import JobBuilder
+from lava_ctl.lava.jobs import Job, JobDefinition
+from lava_ctl.lava.test import model
+
+
+def make_job(device, inline=False, roles=False, image=False, compressed=False,
+             params=False, steps=None):
+    config = defaultdict(lambda: None)
+    config['device'] = device
+    if image:
+        config['url'] = 'https://host/image.wic.gz'
+    else:
+        config['kernel'] = 'https://host/bzImage'
+        config['rootfs'] = 'https://host/rootfs.ext4' + (
+            '.gz' if compressed else '')
+    job = Job(config=config)
+
+    for i in range(3):
+        if inline:
+            test = {'name': 'inline%d' % i,
+                    'steps': steps or ['echo %d' % i,
+                                       'lava-test-case x --shell true']}
+        else:
+            test = {'name': 'test%d' % i, 'revision': 'abc%d' % i,
+                    'repository': 'https://host/tests.git'}
+            if params:
+                test['params'] = {'A': i, 'B': 'value'}
+        if roles:
+            test['role'] = ['server'] if i % 2 else ['client']
+        job.add_test(model.Test(config=test))
+    return job
+
+
+class JobBuilderTest(unittest.TestCase):
+
+    def rendered(self, job):
+        """Return the definition of the job made with the device template"""
+        definition = JobDefinition(job=job, config=object())
+        return definition._render(job)
+
+    def test_same_as_the_templates(self):
+        options = ['inline', 'roles', 'image', 'compressed', 'params']
+        for device in ['qemux86', 'iot2000']:
+            for values in product([False, True], repeat=len(options)):
+                kwargs = dict(zip(options, values))
+                job = make_job(device, **kwargs)
+                built = JobBuilder().build(job)
+                self.assertNotEqual(built, None)
+                self.assertEqual(built, self.rendered(job),
+                                 '%s %s' % (device, kwargs))
+
+    def test_template_required(self):
+        job = make_job('qemux86', inline=True, steps=['echo a: b'])
+        self.assertEqual(JobBuilder().build(job), None)
+
+        definition = JobDefinition(job=job, config=object())
+        self.assertEqual(definition.get('job_name'),
+                         self.rendered(job)['job_name'])
+
+    def test_unknown_device(self):
+        self.assertEqual(JobBuilder().build(make_job('unknown')), None)
+        self.assertRaises(RuntimeError, JobDefinition,
+                          job=make_job('unknown'), config=object())
+
+
+if __name__ == '__main__':
+    unittest.main()
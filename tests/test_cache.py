@@ -0,0 +1,88 @@
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+
+import git
+
+from lava_ctl.lava.test.cache import TestSetCache
+from lava_ctl.lava.test.repo import TestSetsRepo
+
+URL = 'https://example.com/tests.git'
+SHA = 'a' * 40
+
+
+class TestSetCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = TestSetCache(path=self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.get(URL, SHA, 'ssh/a.yaml'))
+
+    def test_keeps_the_types(self):
+        tests = [{'name': 'a', 'parameters': {1: 'one', True: 'yes'},
+                  'date': datetime.date(2018, 1, 1), 'steps': ['echo a']}]
+        self.cache.put(URL, SHA, 'ssh/a.yaml', tests)
+        self.assertEqual(self.cache.get(URL, SHA, 'ssh/a.yaml'), tests)
+
+    def test_keyed_by_commit_and_path(self):
+        self.cache.put(URL, SHA, 'ssh/a.yaml', [{'name': 'a'}])
+        self.assertIsNone(self.cache.get(URL, 'b' * 40, 'ssh/a.yaml'))
+        self.assertIsNone(self.cache.get(URL, SHA, 'ssh/b.yaml'))
+
+
+class TestSetsRepoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.old_home = os.environ.get('LAVACTL_HOME')
+        os.environ['LAVACTL_HOME'] = self.home
+
+        path = os.path.join(self.home, 'tests')
+        os.makedirs(os.path.join(path, 'ssh'))
+        with open(os.path.join(path, 'ssh', 'a.yaml'), 'w') as f:
+            f.write("tests:\n  - name: a\n    steps: [echo a]\n")
+        repo = git.Repo.init(path)
+        repo.index.add(['ssh/a.yaml'])
+        self.sha = repo.index.commit('tests').hexsha
+        self.config = {'url': path, 'revision': self.sha,
+                       'tests': ['ssh/a.yaml']}
+
+    def tearDown(self):
+        if self.old_home is None:
+            del os.environ['LAVACTL_HOME']
+        else:
+            os.environ['LAVACTL_HOME'] = self.old_home
+        shutil.rmtree(self.home)
+
+    def read(self, repo):
+        with repo as test_sets:
+            return [[t.name for t in tests] for tests in test_sets]
+
+    def test_cached_after_reading(self):
+        repo = TestSetsRepo(self.config)
+        self.assertFalse(repo.cached())
+        self.assertEqual(self.read(repo), [['a']])
+        self.assertTrue(repo.cached())
+
+    def test_reads_the_sets_removed_from_the_cache(self):
+        set_cache = TestSetCache()
+        TestSetsRepo(self.config, set_cache=set_cache).prepare()
+
+        repo = TestSetsRepo(self.config, set_cache=set_cache)
+        self.assertTrue(repo.cached())
+        with repo as test_sets:
+            for name in os.listdir(set_cache.path):
+                os.remove(os.path.join(set_cache.path, name))
+            self.assertEqual([[t.name for t in tests] for tests in test_sets],
+                             [['a']])
+
+
+if __name__ == '__main__':
+    unittest.main()
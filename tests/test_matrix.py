@@ -0,0 +1,65 @@
+import unittest
+
+from lava_ctl.lava.test import matrix
+
+IMAGES = [
+    {'name': 'x86', 'kernel': 'https://host/bzImage',
+     'rootfs': 'https://host/rootfs.ext4'},
+    {'url': 'https://host/image.wic'},
+]
+
+
+class TestMatrixTest(unittest.TestCase):
+
+    def labels(self, test_matrix):
+        return [cell.label for cell in test_matrix.cells()]
+
+    def test_single_cell(self):
+        test_matrix = matrix.TestMatrix(['qemux86'], IMAGES[:1])
+        self.assertTrue(test_matrix.is_single())
+        cells = list(test_matrix.cells())
+        self.assertEqual(len(cells), 1)
+        self.assertEqual(cells[0].device, 'qemux86')
+        self.assertEqual(cells[0].image, {'kernel': 'https://host/bzImage',
+                                          'rootfs': 'https://host/rootfs.ext4'})
+        self.assertEqual(cells[0].params, {})
+
+    def test_product(self):
+        test_matrix = matrix.TestMatrix(['qemux86', 'iot2000'], IMAGES,
+                                        params={'B': [1, 2], 'A': ['x']})
+        self.assertFalse(test_matrix.is_single())
+        self.assertEqual(self.labels(test_matrix), [
+            'qemux86,x86,A=x,B=1', 'qemux86,x86,A=x,B=2',
+            'qemux86,1,A=x,B=1', 'qemux86,1,A=x,B=2',
+            'iot2000,x86,A=x,B=1', 'iot2000,x86,A=x,B=2',
+            'iot2000,1,A=x,B=1', 'iot2000,1,A=x,B=2',
+        ])
+
+    def test_exclude(self):
+        test_matrix = matrix.TestMatrix(
+            ['qemux86', 'iot2000'], IMAGES, params={'A': [1, 2]},
+            exclude=[{'device': 'iot2000', 'image': 'x86'},
+                     {'image': 1, 'params': {'A': 2}}])
+        self.assertEqual(self.labels(test_matrix), [
+            'qemux86,x86,A=1', 'qemux86,x86,A=2', 'qemux86,1,A=1',
+            'iot2000,1,A=1',
+        ])
+
+    def test_include(self):
+        test_matrix = matrix.TestMatrix(
+            ['qemux86'], IMAGES[:1],
+            include=[{'params': {'A': 100}},
+                     {'device': 'iot2000', 'image': 'x86'}])
+        self.assertFalse(test_matrix.is_single())
+        self.assertEqual(self.labels(test_matrix), [
+            'qemux86,x86', 'qemux86,x86,A=100', 'iot2000,x86',
+        ])
+
+    def test_include_unknown_image(self):
+        test_matrix = matrix.TestMatrix(['qemux86'], IMAGES,
+                                        include=[{'image': 'wic'}])
+        self.assertRaises(RuntimeError, list, test_matrix.cells())
+
+
+if __name__ == '__main__':
+    unittest.main()
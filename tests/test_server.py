@@ -0,0 +1,83 @@
+import time
+import unittest
+import threading
+
+from lava_ctl.lava.server import SubmissionWindow
+
+
+class SubmissionWindowTest(unittest.TestCase):
+
+    def acquire_in_thread(self, window, device_types):
+        """Acquire from another thread, return the thread and its result"""
+        result = []
+
+        def acquire():
+            try:
+                result.append(window.acquire(device_types))
+            except SubmissionWindow.Closed, e:
+                result.append(e)
+
+        thread = threading.Thread(target=acquire)
+        thread.daemon = True
+        thread.start()
+        return thread, result
+
+    def test_unlimited(self):
+        window = SubmissionWindow()
+        for _ in range(10):
+            window.acquire(['qemu'])
+        self.assertEqual(window.in_flight, 10)
+
+    def test_max_in_flight(self):
+        window = SubmissionWindow(max_in_flight=2)
+        ticket = window.acquire(['qemu'])
+        window.acquire(['qemu'])
+        self.assertEqual(window.in_flight, 2)
+
+        thread, result = self.acquire_in_thread(window, ['qemu'])
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(window.in_flight, 2)
+
+        window.release(ticket)
+        thread.join(5)
+        self.assertEqual(result, [{'qemu': 1}])
+        self.assertEqual(window.in_flight, 2)
+
+    def test_per_device_type(self):
+        window = SubmissionWindow(per_device_type={'qemu': 1})
+        window.acquire(['qemu'])
+        window.acquire(['iot2000', 'iot2000'])
+
+        thread, result = self.acquire_in_thread(window, ['iot2000', 'qemu'])
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        window.close()
+        thread.join(5)
+        self.assertTrue(isinstance(result[0], SubmissionWindow.Closed))
+
+    def test_exchange(self):
+        window = SubmissionWindow(per_device_type={'qemu': 1})
+        ticket = window.acquire(['qemu'])
+        ticket = window.exchange(ticket, ['qemu-kvm'])
+        self.assertEqual(ticket, {'qemu-kvm': 1})
+        self.assertEqual(window.in_flight, 1)
+
+        # the slot of qemu is free again
+        window.acquire(['qemu'])
+        self.assertEqual(window.in_flight, 2)
+
+    def test_big_submission_when_empty(self):
+        window = SubmissionWindow(max_in_flight=2)
+        ticket = window.acquire(['qemu'] * 3)
+        self.assertEqual(ticket, {'qemu': 3})
+        self.assertEqual(window.in_flight, 3)
+
+    def test_closed(self):
+        window = SubmissionWindow(max_in_flight=2)
+        window.close()
+        self.assertRaises(SubmissionWindow.Closed, window.acquire, ['qemu'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from collections import namedtuple
+
+from lava_ctl.lava.sharding import balance
+
+Test = namedtuple('Test', ['name'])
+
+
+class BalanceTest(unittest.TestCase):
+
+    def tests(self, *names):
+        return [Test(name) for name in names]
+
+    def test_longest_first(self):
+        tests = self.tests('a', 'b', 'c', 'd')
+        durations = {'a': 10, 'b': 3, 'c': 4, 'd': 3}
+        shards = balance(tests, 2, durations)
+        self.assertEqual([[t.name for t in s] for s in shards],
+                         [['a'], ['b', 'c', 'd']])
+
+    def test_keeps_the_order_in_each_shard(self):
+        tests = self.tests('a', 'b', 'c', 'd', 'e', 'f')
+        durations = dict((t.name, 6 - i) for i, t in enumerate(tests))
+        for shard in balance(tests, 3, durations):
+            self.assertEqual(shard, sorted(shard, key=tests.index))
+
+    def test_every_test_once(self):
+        tests = self.tests(*'abcdefg')
+        shards = balance(tests, 3, {'a': 5, 'c': 1})
+        self.assertEqual(sorted(t for s in shards for t in s), sorted(tests))
+
+    def test_unknown_durations_count_as_the_mean(self):
+        tests = self.tests('a', 'b', 'c')
+        shards = balance(tests, 2, {'a': 2, 'b': 4})
+        self.assertEqual([[t.name for t in s] for s in shards],
+                         [['b'], ['a', 'c']])
+
+    def test_without_durations(self):
+        shards = balance(self.tests('a', 'b', 'c', 'd'), 2)
+        self.assertEqual([len(s) for s in shards], [2, 2])
+
+    def test_drops_empty_shards(self):
+        shards = balance(self.tests('a', 'b'), 4, {})
+        self.assertEqual(len(shards), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from lava_ctl.lava.validation import JobValidator, ValidationCache
+
+DEFINITION = u'job_name: test\ndevice_type: qemux86\n'
+
+
+def job(test):
+    """Return a job definition dictionary with the given test action"""
+    return {
+        'job_name': 'test',
+        'device_type': 'qemux86',
+        'timeouts': {'job': {'minutes': 10}},
+        'actions': [
+            {'deploy': {'to': 'tmpfs', 'image': {'url': 'lxc://host/x'}}},
+            {'boot': {'method': 'qemu'}},
+            {'test': test},
+        ],
+    }
+
+
+class JobValidatorTest(unittest.TestCase):
+
+    def validate(self, definition):
+        validator = JobValidator()
+        return validator.validate(definition), validator.errors
+
+    def test_definitions(self):
+        valid, errors = self.validate(job({'definitions': [{
+            'from': 'git', 'name': 'smoke', 'path': 'smoke.yaml',
+            'repository': 'https://host/tests.git', 'revision': 1234,
+            'parameters': {'ITERATIONS': 5, 'VERBOSE': True}}]}))
+        self.assertTrue(valid, errors)
+
+    def test_monitors(self):
+        valid, errors = self.validate(job({'monitors': [{
+            'name': 'tests', 'start': 'BOOTING', 'end': 'DONE',
+            'pattern': '(?P<result>pass|fail)'}]}))
+        self.assertTrue(valid, errors)
+
+    def test_interactive(self):
+        valid, errors = self.validate(job({'interactive': [{
+            'name': 'shell', 'prompts': ['# '],
+            'script': [{'command': 'uname'}]}]}))
+        self.assertTrue(valid, errors)
+
+    def test_definitions_and_monitors(self):
+        valid, errors = self.validate(job({
+            'definitions': [{'from': 'inline', 'name': 'a', 'path': 'a.yaml',
+                             'repository': {}}],
+            'monitors': [{'name': 'tests'}]}))
+        self.assertFalse(valid)
+
+    def test_fractional_timeout(self):
+        definition = job({'monitors': [{'name': 'tests'}]})
+        definition['timeouts']['job'] = {'minutes': 1.5}
+        self.assertTrue(self.validate(definition)[0])
+
+
+class ValidationCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def cache(self, url='http://lava/', version='2017.10', ttl=None):
+        return ValidationCache(url, version, ttl=ttl, path=self.path)
+
+    def test_key(self):
+        cache = self.cache()
+        self.assertEqual(cache.key(DEFINITION), cache.key(DEFINITION))
+        self.assertEqual(cache.key(DEFINITION),
+                         cache.key(DEFINITION.encode('utf-8')))
+        self.assertNotEqual(cache.key(DEFINITION),
+                            cache.key(DEFINITION + u'priority: low\n'))
+
+    def test_key_depends_on_the_master(self):
+        key = self.cache().key(DEFINITION)
+        self.assertNotEqual(key, self.cache(url='http://other/').key(DEFINITION))
+        self.assertNotEqual(key, self.cache(version='2018.1').key(DEFINITION))
+
+    def test_valid_once_added(self):
+        cache = self.cache()
+        self.assertFalse(cache.valid(DEFINITION))
+        cache.add(DEFINITION)
+        self.assertTrue(cache.valid(DEFINITION))
+        self.assertTrue(self.cache().valid(DEFINITION))
+        self.assertFalse(self.cache(version='2018.1').valid(DEFINITION))
+
+    def test_ttl(self):
+        cache = self.cache(ttl=60)
+        cache.add(DEFINITION)
+        entry = os.path.join(self.path, cache.key(DEFINITION))
+        past = time.time() - 61
+        os.utime(entry, (past, past))
+        self.assertFalse(cache.valid(DEFINITION))
+
+        cache.add(DEFINITION)
+        self.assertTrue(cache.valid(DEFINITION))
+
+    def test_prune(self):
+        cache = self.cache(ttl=60)
+        cache.add(DEFINITION)
+        cache.add(DEFINITION + u'priority: low\n')
+        entry = os.path.join(self.path, cache.key(DEFINITION))
+        past = time.time() - 61
+        os.utime(entry, (past, past))
+
+        cache.prune()
+        self.assertEqual(os.listdir(self.path),
+                         [cache.key(DEFINITION + u'priority: low\n')])
+
+
+if __name__ == '__main__':
+    unittest.main()